@@ -21,6 +21,40 @@ DB_HOST=localhost
 DB_PORT=5432
 LANGUAGE_CODE=zh-hant
 TIME_ZONE=Asia/Taipei
+BRANCH_CONTEXT_SCOPE=session (or transaction)
+BRANCH_CONTEXT_LAZY=False
+DB_CONN_MAX_AGE=0 (defaults to 60 with transaction scope)
+DB_DISABLE_SERVER_SIDE_CURSORS=False (True behind PgBouncer transaction pooling)
+TENANT_ASYNC_VIEWS=False (True when served by an ASGI server)
+DB_POOL=False (True to use the psycopg 3 connection pool)
+DB_POOL_MIN_SIZE=2
+DB_POOL_MAX_SIZE=10
+DB_POOL_TIMEOUT=10
+DB_REPLICA_HOSTS= (comma-separated host[:port] list, empty for none)
+DB_REPLICA_NAME=rls_db
+DB_REPLICA_STICKY_SECONDS=5
+QUERY_STATEMENT_TIMEOUT_MS=5000
+QUERY_LOCK_TIMEOUT_MS=1000
+BRANCH_TOKEN_TTL=300
+BRANCH_TOKEN_CACHE=default (cache alias shared by all workers, e.g. Redis)
+BRANCH_TOKEN_ALLOW_LOCAL_CACHE= (defaults to DEBUG; True allows a per-process locmem cache)
+BRANCH_THROTTLE_ENABLED=False
+BRANCH_THROTTLE_MAX_IN_FLIGHT=4
+BRANCH_THROTTLE_RATE=20
+BRANCH_THROTTLE_BURST=40
+CACHE_BACKEND=django.core.cache.backends.locmem.LocMemCache
+CACHE_LOCATION=rls-project
+RESPONSE_CACHE_ENABLED=True
+RESPONSE_CACHE_TIMEOUT=30
+REQUEST_METRICS_ENABLED=True
+REQUEST_METRICS_SERVER_TIMING=True
+REQUEST_METRICS_TOKEN= (bearer token required by /metrics/; empty allows REQUEST_METRICS_ALLOWED_IPS only)
+REQUEST_METRICS_ALLOWED_IPS=127.0.0.1,::1
+SALES_WRITE_BEHIND_ENABLED=False
+SALES_WRITE_BEHIND_WAIT_FOR_COMMIT=True (False answers 202 as soon as a sale is queued)
+SALES_WRITE_BEHIND_FLUSH_SIZE=500
+SALES_WRITE_BEHIND_FLUSH_INTERVAL=0.05
+SALES_WRITE_BEHIND_MAX_QUEUE=10000
 """
 
 import os
@@ -67,6 +101,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'tenants.middleware.BranchMiddleware',
+    'tenants.middleware.BranchThrottleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,9 +126,24 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'rls_project.wsgi.application'
 
+# Serve the tenant API with native async views (enable when running under ASGI)
+TENANT_ASYNC_VIEWS = os.getenv('TENANT_ASYNC_VIEWS', 'False').lower() in ('true', '1', 'yes', 'on')
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Branch context scope:
+# - 'session': SET app.current_branch_id per request (connections cannot be reused)
+# - 'transaction': set_config(..., true) inside a per-request transaction, so the
+#   context is dropped at COMMIT and connections can be persistent or pooled
+#   (also safe behind PgBouncer in transaction pooling mode)
+BRANCH_CONTEXT_SCOPE = os.getenv('BRANCH_CONTEXT_SCOPE', 'session')
+
+# Defer the context SET to the request's first query (no round trips at all
+# for requests that never query, e.g. response-cache hits: the cache is
+# checked before the ETag version query)
+BRANCH_CONTEXT_LAZY = os.getenv('BRANCH_CONTEXT_LAZY', 'False').lower() in ('true', '1', 'yes', 'on')
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
@@ -102,10 +152,55 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'postgres'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
-        'CONN_MAX_AGE': 0,  # Disable connection pooling for RLS session variables
+        # Session-scoped RLS variables require a fresh connection per request
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_CONN_MAX_AGE', '60' if BRANCH_CONTEXT_SCOPE == 'transaction' else '0'
+        )),
+        'CONN_HEALTH_CHECKS': BRANCH_CONTEXT_SCOPE == 'transaction',
+        # PgBouncer transaction pooling cannot keep named cursors between transactions
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_DISABLE_SERVER_SIDE_CURSORS', 'False'
+        ).lower() in ('true', '1', 'yes', 'on'),
     }
 }
 
+# psycopg 3 connection pool (Django >= 5.1). Connections come back to the
+# pool through tenants.pool.reset_branch_context, which clears the branch
+# context or discards the connection. Django requires CONN_MAX_AGE = 0 here.
+if os.getenv('DB_POOL', 'False').lower() in ('true', '1', 'yes', 'on'):
+    from tenants.pool import reset_branch_context
+
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # max wait for a checkout
+            'reset': reset_branch_context,
+        },
+    }
+
+# Read replicas: DB_REPLICA_HOSTS=host[:port],... adds aliases replica1, replica2, ...
+# with the primary's settings. Safe /api/ requests read from a replica with the
+# branch context bound there (tenants.routers). Two databases on one server
+# also work for testing: DB_REPLICA_HOSTS=localhost DB_REPLICA_NAME=rls_db_replica
+REPLICA_DATABASES = []
+for _i, _host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    _host, _, _port = _host.strip().partition(':')
+    DATABASES[f'replica{_i}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{_i}')
+
+DATABASE_ROUTERS = ['tenants.routers.ReplicaRouter']
+
+# Seconds a branch reads from the primary after a write (read-your-writes)
+REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', '5'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -146,4 +241,106 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Branch settings
-BRANCH_REQUIRED_PATHS = ['/api/']  # Paths that require branch context
\ No newline at end of file
+BRANCH_REQUIRED_PATHS = ['/api/']  # Paths that require branch context
+
+# Sales list pagination (keyset on date, id)
+SALES_PAGE_DEFAULT_SIZE = 20
+SALES_PAGE_MAX_SIZE = int(os.getenv('SALES_PAGE_MAX_SIZE', '200'))
+
+# Bulk ingest (POST /api/sales/bulk/)
+SALES_BULK_MAX_RECORDS = int(os.getenv('SALES_BULK_MAX_RECORDS', '5000'))
+SALES_BULK_BATCH_SIZE = 1000  # rows per INSERT ... ON CONFLICT statement
+
+# Group commit for single sale POSTs (tenants/write_behind.py): rows are
+# queued and upserted per branch every FLUSH_INTERVAL seconds or FLUSH_SIZE
+# rows. A full queue falls back to the synchronous insert.
+SALES_WRITE_BEHIND = {
+    'ENABLED': os.getenv('SALES_WRITE_BEHIND_ENABLED', 'False').lower() in ('true', '1', 'yes', 'on'),
+    'WAIT_FOR_COMMIT': os.getenv('SALES_WRITE_BEHIND_WAIT_FOR_COMMIT', 'True').lower() in ('true', '1', 'yes', 'on'),
+    'ACK_TIMEOUT': 5,  # seconds a waiting POST gives its batch before answering 202
+    'FLUSH_SIZE': int(os.getenv('SALES_WRITE_BEHIND_FLUSH_SIZE', '500')),
+    'FLUSH_INTERVAL': float(os.getenv('SALES_WRITE_BEHIND_FLUSH_INTERVAL', '0.05')),  # seconds
+    'MAX_QUEUE': int(os.getenv('SALES_WRITE_BEHIND_MAX_QUEUE', '10000')),
+}
+
+# Rows fetched per server-side cursor round trip by the streaming export
+SALES_EXPORT_CHUNK_SIZE = int(os.getenv('SALES_EXPORT_CHUNK_SIZE', '2000'))
+
+# Threads (and database connections) used by the HQ per-branch fan-out;
+# keep it at or below DB_POOL_MAX_SIZE when the pool is enabled
+HQ_REPORT_WORKERS = int(os.getenv('HQ_REPORT_WORKERS', '8'))
+
+# Per-worker cache of active branches used by BranchMiddleware
+BRANCH_CACHE = {
+    'MAX_SIZE': int(os.getenv('BRANCH_CACHE_MAX_SIZE', '1024')),
+    'TTL': int(os.getenv('BRANCH_CACHE_TTL', '60')),  # seconds
+}
+
+# Per-branch fairness limits (tenants.throttling); 0 disables a limit.
+# OVERRIDES maps a branch id to its own MAX_IN_FLIGHT / RATE / BURST.
+# Limits only hold across worker processes with a shared cache backend.
+BRANCH_THROTTLE = {
+    'ENABLED': os.getenv('BRANCH_THROTTLE_ENABLED', 'False').lower() in ('true', '1', 'yes', 'on'),
+    'CACHE': 'default',
+    'MAX_IN_FLIGHT': int(os.getenv('BRANCH_THROTTLE_MAX_IN_FLIGHT', '4')),
+    'RATE': float(os.getenv('BRANCH_THROTTLE_RATE', '20')),  # requests per second
+    'BURST': int(os.getenv('BRANCH_THROTTLE_BURST', '40')),
+    'OVERRIDES': {},
+}
+
+# statement_timeout / lock_timeout per endpoint (URL name), in ms; 0 = no limit.
+# BRANCHES maps a branch id to {'DEFAULT': {...}, '<endpoint>': {...}} overrides.
+# Sent in the same statement as the branch context, so they add no round trip.
+QUERY_BUDGETS = {
+    'DEFAULT': {
+        'STATEMENT_TIMEOUT': int(os.getenv('QUERY_STATEMENT_TIMEOUT_MS', '5000')),
+        'LOCK_TIMEOUT': int(os.getenv('QUERY_LOCK_TIMEOUT_MS', '1000')),
+    },
+    'ENDPOINTS': {
+        'sales_list': {'STATEMENT_TIMEOUT': 2000},
+        'sales_summary': {'STATEMENT_TIMEOUT': 10000},
+        'sales_bulk': {'STATEMENT_TIMEOUT': 30000},
+        'sales_export': {'STATEMENT_TIMEOUT': 0},  # streams for as long as it takes
+    },
+    'BRANCHES': {},
+}
+
+# Signed branch tokens (X-Branch-Token, issued by POST /api/branch-token/)
+# Revocations (deny-list) live in CACHE, which must be shared by every worker
+# process; a process-local backend (locmem) is refused unless ALLOW_LOCAL_CACHE
+# (single-process or development setups)
+BRANCH_TOKEN = {
+    'TTL': int(os.getenv('BRANCH_TOKEN_TTL', '300')),  # seconds
+    'CACHE': os.getenv('BRANCH_TOKEN_CACHE', 'default'),
+    'ALLOW_LOCAL_CACHE': os.getenv('BRANCH_TOKEN_ALLOW_LOCAL_CACHE', str(DEBUG)).lower() in ('true', '1', 'yes', 'on'),
+}
+
+# Cache framework; locmem by default, e.g. CACHE_BACKEND=
+# django.core.cache.backends.filebased.FileBasedCache with CACHE_LOCATION=/tmp/rls-cache
+# to share entries between worker processes
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'rls-project'),
+    }
+}
+
+# Branch-scoped response cache (tenants.response_cache)
+RESPONSE_CACHE = {
+    'ENABLED': os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() in ('true', '1', 'yes', 'on'),
+    'ALIAS': 'default',
+    'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', '30')),  # seconds
+}
+
+# Per-request DB instrumentation (Server-Timing header and /metrics/)
+REQUEST_METRICS = {
+    'ENABLED': os.getenv('REQUEST_METRICS_ENABLED', 'True').lower() in ('true', '1', 'yes', 'on'),
+    'SERVER_TIMING': os.getenv('REQUEST_METRICS_SERVER_TIMING', 'True').lower() in ('true', '1', 'yes', 'on'),
+    'MAX_BRANCHES': int(os.getenv('REQUEST_METRICS_MAX_BRANCHES', '1000')),  # label cardinality cap
+    # /metrics/ requires "Authorization: Bearer <TOKEN>" when set, otherwise
+    # a REMOTE_ADDR in ALLOWED_IPS (the proxy's address when behind one)
+    'TOKEN': os.getenv('REQUEST_METRICS_TOKEN', ''),
+    'ALLOWED_IPS': tuple(
+        ip.strip() for ip in os.getenv('REQUEST_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()
+    ),
+}
@@ -1,14 +1,22 @@
 """
 URL configuration for rls_project project.
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from tenants import views
+from tenants import async_views, views
+
+# Native async views under ASGI (TENANT_ASYNC_VIEWS), sync views otherwise
+api = async_views if settings.TENANT_ASYNC_VIEWS else views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/branches/', views.branch_list, name='branch_list'),
-    path('api/sales/', views.sales_list, name='sales_list'),
-    path('api/sales-summary/', views.sales_summary, name='sales_summary'),
-    path('api/context-status/', views.context_status, name='context_status'),
+    path('api/branches/', api.branch_list, name='branch_list'),
+    path('api/sales/', api.sales_list, name='sales_list'),
+    path('api/sales/bulk/', views.sales_bulk, name='sales_bulk'),
+    path('api/sales/export/', api.sales_export, name='sales_export'),
+    path('api/sales-summary/', api.sales_summary, name='sales_summary'),
+    path('api/branch-token/', views.branch_token, name='branch_token'),
+    path('api/context-status/', api.context_status, name='context_status'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
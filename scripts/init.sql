@@ -29,12 +29,12 @@ GRANT USAGE, SELECT ON SEQUENCES TO app_role;
 -- =====================================
 
 -- Get current branch ID from session variable
+-- (STABLE SQL so the planner can inline it into the RLS policies and use
+-- the branch_id index; see tenants/migrations/0004_inline_branch_predicate.py)
 CREATE OR REPLACE FUNCTION get_current_branch_id() 
 RETURNS UUID AS $$
-BEGIN
-    RETURN COALESCE(current_setting('app.current_branch_id', true)::UUID, NULL);
-END;
-$$ LANGUAGE plpgsql SECURITY DEFINER;
+    SELECT NULLIF(current_setting('app.current_branch_id', true), '')::uuid
+$$ LANGUAGE sql STABLE PARALLEL SAFE;
 
 -- =====================================
 -- Context Check View
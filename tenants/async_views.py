@@ -0,0 +1,181 @@
+"""Async versions of the tenant API views, used when served under ASGI.
+
+Async ORM calls run through sync_to_async(thread_sensitive=True), i.e. on
+the same per-request thread (and database connection) that BranchMiddleware
+used to bind the branch context, so RLS applies exactly as in the sync views.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from .models import Branch, Sales
+from .budgets import query_budget, timeout_response
+from .context import same_branch
+from .conditional import condition_on_branch_version
+from .export import STREAMERS, astream, export_rows
+from .response_cache import cache_branch_response, first_page
+from .serialization import json_response
+from .tokens import ensure_branch_loaded
+from .write_behind import ack_timeout, sales_write_behind, wait_for_commit, write_behind_enabled
+from .views import (
+    branch_projection, context_status_response, export_params, export_response, fetch_context_info,
+    fetch_sales_page, queued_sale, queued_sale_response, sale_created_response, sale_fields,
+    sales_page_query, sales_page_response, summary_params, summary_response,
+)
+import asyncio
+import json
+
+# Branch related APIs
+
+@csrf_exempt
+@cache_branch_response()
+@query_budget('branch_list')
+async def branch_list(request):
+    """Branch list API - demonstrates RLS isolation"""
+    if not getattr(request, 'branch_id', None):
+        return JsonResponse({'error': 'Branch context required'}, status=400)
+
+    if request.method == 'GET':
+        try:
+            projection = branch_projection(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        try:
+            # RLS ensures each branch only sees its own data
+            branches = Branch.objects.filter(is_active=True).values_list(*projection.columns)
+            data = projection.serialize([b async for b in branches])
+
+            return json_response({
+                'branches': data,
+                'count': len(data),
+                'current_branch_id': str(request.branch_id)
+            })
+
+        except Exception as e:
+            return timeout_response(e) or JsonResponse({'error': f'Query failed: {str(e)}'}, status=500)
+
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+# Sales related APIs
+
+@csrf_exempt
+@cache_branch_response(cache_if=first_page)
+@condition_on_branch_version
+@query_budget('sales_list')
+async def sales_list(request):
+    """Sales records API - RLS automatically filters by branch"""
+    if not getattr(request, 'branch_id', None):
+        return JsonResponse({'error': 'Branch context required'}, status=400)
+
+    if request.method == 'GET':
+        try:
+            try:
+                limit, projection, sales = sales_page_query(request)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            rows = await sync_to_async(fetch_sales_page)(sales, projection, limit)
+            if 'branch_name' in projection.fields:
+                # A token request's branch is lazy; load it off the event loop
+                await sync_to_async(ensure_branch_loaded)(request)
+
+            return json_response(sales_page_response(request, rows, projection, limit))
+
+        except Exception as e:
+            return timeout_response(e) or JsonResponse({'error': f'Query failed: {str(e)}'}, status=500)
+
+    elif request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+
+            if not same_branch(data['branch_id'], request.branch_id):
+                return JsonResponse({'error': 'Branch not found or access denied'}, status=404)
+
+            future = None
+            if write_behind_enabled():
+                # request.branch may be lazy (token requests); resolve it off the event loop
+                sale = await sync_to_async(queued_sale)(data, request.branch)
+                future = sales_write_behind.submit(sale)
+            if future is None:
+                sale = await Sales.objects.acreate(branch=request.branch, **sale_fields(data))
+                return JsonResponse(sale_created_response(sale), status=201)
+
+            if wait_for_commit():
+                try:
+                    # shield(): timing out must not cancel the queued write
+                    sale = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), ack_timeout())
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    return JsonResponse(sale_created_response(sale), status=201)
+            return JsonResponse(queued_sale_response(sale), status=202)
+
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON format'}, status=400)
+        except ValidationError as e:
+            return JsonResponse({'error': '; '.join(e.messages)}, status=400)
+        except Exception as e:
+            return timeout_response(e) or JsonResponse({'error': f'Create failed: {str(e)}'}, status=500)
+
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@csrf_exempt
+async def sales_export(request):
+    """Stream all of the branch's sales as NDJSON or CSV (flat worker memory)"""
+    if not getattr(request, 'branch_id', None):
+        return JsonResponse({'error': 'Branch context required'}, status=400)
+
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        export_format, start, end = export_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # The filename needs the branch, which is lazy for token requests
+    await sync_to_async(ensure_branch_loaded)(request)
+    rows = export_rows(request.branch_id, start, end)
+    # A sync iterator would be buffered in full by the ASGI handler
+    return export_response(request, astream(STREAMERS[export_format](rows)), export_format)
+
+@csrf_exempt
+@cache_branch_response()
+@condition_on_branch_version
+@query_budget('sales_summary')
+async def sales_summary(request):
+    """Simple sales summary - demonstrates RLS in action"""
+    if not getattr(request, 'branch_id', None):
+        return JsonResponse({'error': 'Branch context required'}, status=400)
+
+    try:
+        params = summary_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        # Raw rollup queries: one thread hop for the whole summary
+        response = await sync_to_async(summary_response)(request, *params)
+        return JsonResponse(response)
+
+    except Exception as e:
+        return timeout_response(e) or JsonResponse({'error': f'Summary failed: {str(e)}'}, status=500)
+
+# Debug endpoint for demo
+
+@csrf_exempt
+@query_budget('context_status')
+async def context_status(request):
+    """Check current branch context for demo purposes"""
+    try:
+        context_info = await sync_to_async(fetch_context_info)()
+        visible_branches = await Branch.objects.acount()
+        visible_sales = await Sales.objects.acount()
+
+        return JsonResponse(
+            context_status_response(request, context_info, visible_branches, visible_sales)
+        )
+
+    except Exception as e:
+        return timeout_response(e) or JsonResponse({'error': f'Status check failed: {str(e)}'}, status=500)
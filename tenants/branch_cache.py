@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+
+class BranchCache:
+    """Per-worker LRU cache of active branches with a TTL.
+
+    Only active branches are stored, keyed on the canonical branch id
+    (BranchMiddleware normalizes request.branch_id). Writes to Branch
+    invalidate the entry immediately and again when their transaction
+    commits (see signals.py); other worker processes pick up the change when
+    their entry expires, so TTL bounds cross-process staleness.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, branch_id):
+        key = str(branch_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def generation(self):
+        """Token to pass to put(); loads racing an invalidation are dropped."""
+        return self._generation
+
+    def put(self, branch, generation):
+        if not branch.is_active:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            key = str(branch.id)
+            self._entries[key] = (branch, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, branch_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(str(branch_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+            }
+
+
+_config = getattr(settings, 'BRANCH_CACHE', {})
+branch_cache = BranchCache(
+    max_size=_config.get('MAX_SIZE', 1024),
+    ttl=_config.get('TTL', 60),
+)
@@ -0,0 +1,147 @@
+"""Per-endpoint (and optionally per-branch) statement_timeout / lock_timeout.
+
+QUERY_BUDGETS values are milliseconds, 0 meaning no limit. A budget is
+resolved as DEFAULT, then ENDPOINTS[endpoint], then the branch's own
+BRANCHES[branch_id]['DEFAULT'] and BRANCHES[branch_id][endpoint].
+
+@query_budget(endpoint) tags the view; BranchMiddleware resolves the view
+up front and sends the budget's timeouts in the same statement that binds
+the branch context (context.set_branch_context() and friends), so budgets
+cost no extra round trip. They are transaction-local in transaction scope
+(SET LOCAL semantics) and session-level otherwise, reset together with the
+context. Requests the middleware did not bind a context for fall back to a
+separate statement, restored afterwards unless the connection is closed at
+the end of the request anyway (CONN_MAX_AGE = 0). Views turn a timeout into
+504 (statement) or 503 (lock) through timeout_response().
+"""
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from .context import TIMEOUT_SETTINGS
+from .routers import read_connection
+
+# SQLSTATEs raised by statement_timeout and lock_timeout
+QUERY_CANCELED = '57014'
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def resolve_budget(endpoint, branch_id=None):
+    config = getattr(settings, 'QUERY_BUDGETS', {})
+    budget = dict(config.get('DEFAULT', {}))
+    budget.update(config.get('ENDPOINTS', {}).get(endpoint, {}))
+    if branch_id:
+        branch = config.get('BRANCHES', {}).get(str(branch_id).lower(), {})
+        budget.update(branch.get('DEFAULT', {}))
+        budget.update(branch.get(endpoint, {}))
+    return budget
+
+
+def budget_endpoint(request):
+    """QUERY_BUDGETS endpoint of the view a request resolves to (None if not tagged)"""
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    return getattr(match.func, 'query_budget_endpoint', None)
+
+
+def set_timeouts(conn, budget, local):
+    """Apply a budget in one round trip; returns the previous values"""
+    names = [(key, name) for key, name in TIMEOUT_SETTINGS if key in budget]
+    if not names:
+        return []
+    columns, params = [], []
+    for key, name in names:
+        # current_setting() is evaluated before the set_config() next to it
+        columns.append("current_setting(%s), set_config(%s, %s, %s)")
+        params += [name, name, f"{int(budget[key])}ms", local]
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT " + ", ".join(columns), params)
+        row = cursor.fetchone()
+    return [(name, row[i * 2]) for i, (_, name) in enumerate(names)]
+
+
+def restore_timeouts(conn, previous):
+    if not previous:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT " + ", ".join("set_config(%s, %s, false)" for _ in previous),
+            [value for pair in previous for value in pair]
+        )
+
+
+def apply_budget(request, endpoint):
+    """Set the request's timeouts; returns a callable that undoes them (or None)"""
+    if getattr(request, 'query_budget_applied', False):
+        # Already sent with the branch context
+        return None
+    budget = resolve_budget(endpoint, getattr(request, 'branch_id', None))
+    conn = read_connection()
+    if conn.in_atomic_block:
+        # SET LOCAL semantics: dropped with the branch context at COMMIT
+        set_timeouts(conn, budget, True)
+        return None
+    previous = set_timeouts(conn, budget, False)
+    if not conn.settings_dict.get('CONN_MAX_AGE'):
+        # Closed (or reset by the pool) at the end of the request
+        return None
+    return lambda: restore_timeouts(conn, previous)
+
+
+def query_budget(endpoint):
+    """Run a sync or async view under the endpoint's query budget"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if getattr(request, 'query_budget_applied', False):
+                    return await view(request, *args, **kwargs)
+                restore = await sync_to_async(apply_budget)(request, endpoint)
+                try:
+                    return await view(request, *args, **kwargs)
+                finally:
+                    if restore:
+                        await sync_to_async(restore)()
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                restore = apply_budget(request, endpoint)
+                try:
+                    return view(request, *args, **kwargs)
+                finally:
+                    if restore:
+                        restore()
+        # Outer decorators keep it through functools.wraps (budget_endpoint())
+        wrapper.query_budget_endpoint = endpoint
+        return wrapper
+    return decorator
+
+
+def _sqlstate(exc):
+    cause = exc.__cause__
+    # psycopg 3 / psycopg2
+    return getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+
+
+def timeout_response(exc):
+    """503/504 for an exceeded budget, None for any other error"""
+    if not isinstance(exc, OperationalError):
+        return None
+    sqlstate = _sqlstate(exc)
+    if sqlstate not in (QUERY_CANCELED, LOCK_NOT_AVAILABLE):
+        return None
+
+    conn = read_connection()
+    if conn.in_atomic_block:
+        # The transaction is aborted; make sure it is rolled back, not committed
+        transaction.set_rollback(True, using=conn.alias)
+
+    if sqlstate == QUERY_CANCELED:
+        return JsonResponse({'error': 'Query time budget exceeded'}, status=504)
+    response = JsonResponse({'error': 'Data is busy, try again shortly'}, status=503)
+    response['Retry-After'] = '1'
+    return response
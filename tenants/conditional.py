@@ -0,0 +1,65 @@
+"""Conditional GET for branch-scoped views.
+
+The ETag is derived from the branch's BranchDataVersion (bumped by a
+trigger on every write to tenants_sales, migration 0007) and the request's
+full path, so a matching If-None-Match is answered with 304 after a single
+primary-key lookup, without running the view.
+"""
+import hashlib
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from .routers import read_connection
+
+
+def branch_data_version(branch_id):
+    """Current data version of a branch (0 before its first sales write)"""
+    with read_connection().cursor() as cursor:
+        cursor.execute(
+            "SELECT version FROM tenants_branchdataversion WHERE branch_id = %s", [str(branch_id)]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def branch_etag(request):
+    """Quoted ETag for this request, or None when it is not conditional"""
+    if request.method not in ('GET', 'HEAD') or not getattr(request, 'branch_id', None):
+        return None
+    version = branch_data_version(request.branch_id)
+    key = f"{request.branch_id}|{version}|{request.get_full_path()}"
+    return quote_etag(hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+
+def _finalize(request, response, etag):
+    if etag is None or request.method not in ('GET', 'HEAD'):
+        return response
+    if response.status_code in (200, 304):
+        if not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+        # Per-branch representation: clients and proxies must revalidate
+        patch_vary_headers(response, ['X-Branch-ID', 'X-Branch-Token'])
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def condition_on_branch_version(view):
+    """ETag / If-None-Match support for sync and async branch views"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            etag = await sync_to_async(branch_etag)(request)
+            response = get_conditional_response(request, etag=etag) if etag else None
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return _finalize(request, response, etag)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag = branch_etag(request)
+            response = get_conditional_response(request, etag=etag) if etag else None
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finalize(request, response, etag)
+    return wrapper
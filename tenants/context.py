@@ -0,0 +1,174 @@
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from .models import Branch
+from .pool import ensure_connection_timed
+
+# Postgres setting read by the RLS policies (see get_current_branch_id())
+BRANCH_SETTING = 'app.current_branch_id'
+
+# Leading comment on every statement that sets or resets the branch context;
+# the setting name itself is a bound parameter, invisible in the SQL text
+CONTEXT_TAG = '/* branch-context */'
+
+# QUERY_BUDGETS keys and the Postgres settings they map to (tenants.budgets)
+TIMEOUT_SETTINGS = (('STATEMENT_TIMEOUT', 'statement_timeout'), ('LOCK_TIMEOUT', 'lock_timeout'))
+
+
+def canonical_branch_id(value):
+    """Lower-case, hyphenated form of a branch UUID; raises ValueError/TypeError.
+
+    uuid.UUID() also accepts upper case, braces and missing hyphens, so ids
+    are normalized before anything is keyed on them.
+    """
+    if value is None:
+        return None
+    return str(uuid.UUID(str(value)))
+
+
+def same_branch(a, b):
+    """True when two branch id spellings name the same branch"""
+    try:
+        return canonical_branch_id(a) == canonical_branch_id(b)
+    except (ValueError, TypeError):
+        return False
+
+
+def is_transaction_scoped():
+    """True when the branch context is bound to the current transaction only."""
+    return getattr(settings, 'BRANCH_CONTEXT_SCOPE', 'session') == 'transaction'
+
+
+def _context_connection(using):
+    conn = connections[using]
+    if is_transaction_scoped() and not conn.in_atomic_block:
+        raise RuntimeError('Transaction-scoped branch context requires an atomic block')
+    ensure_connection_timed(conn)
+    return conn
+
+
+def _mark_bound(conn, budget=None):
+    # Remember which DB-API connection carries a session-level context, so
+    # clear_branch_context() can skip the reset when nothing was ever set
+    if not is_transaction_scoped():
+        conn.ensure_connection()
+        conn.branch_context_connection = conn.connection
+        if _budget_columns(budget, False)[0]:
+            conn.branch_context_budget = True
+
+
+def _budget_columns(budget, local):
+    """set_config() columns applying a query budget in the context statement"""
+    columns, params = [], []
+    for key, name in TIMEOUT_SETTINGS:
+        if budget and key in budget:
+            columns.append("set_config(%s, %s, %s)")
+            params += [name, f"{int(budget[key])}ms", local]
+    return columns, params
+
+
+def _context_statement(branch_id, local, budget):
+    columns, params = _budget_columns(budget, local)
+    sql = CONTEXT_TAG + " SELECT " + ", ".join(["set_config(%s, %s, %s)"] + columns)
+    return sql, [BRANCH_SETTING, str(branch_id) if branch_id else '', local] + params
+
+
+def set_branch_context(branch_id, using=DEFAULT_DB_ALIAS, budget=None):
+    """Bind the branch context (and optionally a query budget) on a connection.
+
+    In transaction scope the values are set with set_config(..., true) and
+    are discarded by Postgres at COMMIT/ROLLBACK, so the caller must be
+    inside an atomic block. ``budget`` is a resolved QUERY_BUDGETS entry; its
+    timeouts ride along in the same statement.
+    """
+    conn = _context_connection(using)
+    with conn.cursor() as cursor:
+        cursor.execute(*_context_statement(branch_id, is_transaction_scoped(), budget))
+    _mark_bound(conn, budget)
+
+
+def activate_branch(branch_id, using=DEFAULT_DB_ALIAS, budget=None):
+    """Bind the branch context (and optional budget) and load the branch in one round trip.
+
+    Returns the active Branch, or None (and no context) when the branch does
+    not exist or is inactive. See activate_branch_context() in migration 0003.
+    """
+    conn = _context_connection(using)
+    local = is_transaction_scoped()
+    columns, params = _budget_columns(budget, local)
+    sql = CONTEXT_TAG + " SELECT b.* FROM activate_branch_context(%s, %s) b"
+    if columns:
+        # Volatile output columns of a subquery are always evaluated
+        sql += ", (SELECT " + ", ".join(columns) + ") budget"
+    branches = list(Branch.objects.using(using).raw(sql, [str(branch_id), local] + params))
+    _mark_bound(conn, budget)
+    return branches[0] if branches else None
+
+
+def is_lazy():
+    """True when BranchMiddleware defers the context SET to the first query."""
+    return getattr(settings, 'BRANCH_CONTEXT_LAZY', False)
+
+
+class LazyBranchContext:
+    """execute_wrapper that binds the branch context just before the first query.
+
+    The set_config runs on the same cursor, in the same session/transaction,
+    right before the statement that needs it; a request that never queries
+    never sends it. It goes through the cursor wrapper, so other wrappers
+    (e.g. instrumentation) still see it.
+    """
+
+    def __init__(self, branch_id, using, budget=None):
+        self.branch_id = str(branch_id)
+        self.using = using
+        self.budget = budget
+        self.bound = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.bound:
+            self.bound = True
+            context['cursor'].execute(*_context_statement(self.branch_id, is_transaction_scoped(), self.budget))
+            _mark_bound(connections[self.using], self.budget)
+        return execute(sql, params, many, context)
+
+
+def defer_branch_context(branch_id, using=DEFAULT_DB_ALIAS, budget=None):
+    """Context manager installing a LazyBranchContext on the connection."""
+    return connections[using].execute_wrapper(LazyBranchContext(branch_id, using, budget))
+
+
+def clear_branch_context(using=DEFAULT_DB_ALIAS):
+    """Reset a session-level branch context (nothing to do in transaction scope)."""
+    if is_transaction_scoped():
+        return
+    conn = connections[using]
+    if conn.connection is None or getattr(conn, 'branch_context_connection', None) is not conn.connection:
+        # Nothing was set on this physical connection
+        return
+    sql, params = CONTEXT_TAG + " SELECT set_config(%s, '', false)", [BRANCH_SETTING]
+    if getattr(conn, 'branch_context_budget', False):
+        # Session-level timeouts go back to their defaults in the same statement
+        for _, name in TIMEOUT_SETTINGS:
+            sql += ", set_config(%s, (SELECT reset_val FROM pg_settings WHERE name = %s), false)"
+            params += [name, name]
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+    conn.branch_context_connection = None
+    conn.branch_context_budget = False
+
+
+@contextmanager
+def branch_context(branch_id, using=DEFAULT_DB_ALIAS, budget=None):
+    """Run a block inside its own transaction with a transaction-local branch context.
+
+    Used by code running outside the request cycle (streaming responses,
+    management commands, background workers). The context (and ``budget``'s
+    timeouts) never outlive the transaction, whatever BRANCH_CONTEXT_SCOPE
+    is set to.
+    """
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(*_context_statement(branch_id, True, budget))
+        yield
@@ -0,0 +1,156 @@
+import csv
+import json
+import queue
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections
+from .budgets import resolve_budget
+from .context import branch_context
+from .models import Sales
+from .pagination import seek
+
+EXPORT_FIELDS = ['id', 'date', 'product_category', 'amount', 'transaction_count', 'notes']
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class Echo:
+    """File-like object for csv.writer that hands back each line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_sales(queryset, chunk_size):
+    """Iterate a (date, id)-ordered values_list queryset with flat memory.
+
+    Uses a server-side cursor when available. Behind a transaction-pooling
+    proxy (DISABLE_SERVER_SIDE_CURSORS) the rows are fetched in keyset
+    batches instead, since the client-side cursor would load everything.
+    """
+    if not connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        yield from queryset.iterator(chunk_size=chunk_size)
+        return
+
+    date_index, id_index = EXPORT_FIELDS.index('date'), EXPORT_FIELDS.index('id')
+    batch = list(queryset[:chunk_size])
+    while batch:
+        yield from batch
+        last = batch[-1]
+        batch = list(seek(queryset, last[date_index], last[id_index], descending=False)[:chunk_size])
+
+
+def export_rows(branch_id, start=None, end=None):
+    """Yield the branch's sales as value tuples, oldest first.
+
+    Runs in its own transaction with a transaction-local branch context:
+    the response is streamed after BranchMiddleware has already finished.
+    """
+    chunk_size = settings.SALES_EXPORT_CHUNK_SIZE
+    with branch_context(branch_id, budget=resolve_budget('sales_export', branch_id)):
+        sales = Sales.objects.order_by('date', 'id')
+        if start:
+            sales = sales.filter(date__gte=start)
+        if end:
+            sales = sales.filter(date__lte=end)
+        yield from iter_sales(sales.values_list(*EXPORT_FIELDS), chunk_size)
+
+
+def _serialize(row):
+    return [str(row[0]), row[1].isoformat(), row[2], str(row[3]), row[4], row[5]]
+
+
+def stream_ndjson(rows):
+    for chunk in _chunked(rows):
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_FIELDS, _serialize(row))), ensure_ascii=False) + '\n'
+            for row in chunk
+        )
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for chunk in _chunked(rows):
+        yield ''.join(writer.writerow(_serialize(row)) for row in chunk)
+
+
+def _chunked(rows):
+    # Group rows so each yielded chunk is a reasonably sized write
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= settings.SALES_EXPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+STREAMERS = {
+    'ndjson': stream_ndjson,
+    'csv': stream_csv,
+}
+
+_DONE = object()
+
+
+async def astream(chunks, buffer=2):
+    """Async iterator over a sync chunk generator, for StreamingHttpResponse under ASGI.
+
+    Django's ASGI handler consumes a sync streaming iterator in full before
+    sending anything, so the export would sit in memory. Here the generator
+    runs on its own thread (with its own connection: export_rows() opens its
+    own branch_context()) and blocks once ``buffer`` chunks are waiting, so
+    memory stays flat. Closing the iterator (client gone) stops the thread.
+    """
+    pending = queue.Queue(maxsize=buffer)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(e)
+        finally:
+            chunks.close()
+            connections.close_all()
+
+    def take():
+        # Polls so an executor thread left behind by a cancelled await (client
+        # gone) sees stop and returns instead of blocking forever
+        while not stop.is_set():
+            try:
+                return pending.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    get = sync_to_async(take, thread_sensitive=False)
+    threading.Thread(target=produce, name='sales-export', daemon=True).start()
+    try:
+        while True:
+            item = await get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
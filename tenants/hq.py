@@ -0,0 +1,122 @@
+"""Headquarters reporting: chain-wide aggregates fanned out per branch.
+
+Every branch is queried on its own worker thread, with its own database
+connection and a transaction-local branch context, so RLS applies to each
+query exactly as it does for that branch's API requests. The queries also
+filter on the branch explicitly: listing every branch needs an owner or
+BYPASSRLS role, under which RLS alone would return chain-wide totals for
+each branch. The per-branch results are merged here.
+"""
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.conf import settings
+from django.db import connections
+from .context import branch_context
+from .reports import sales_series, summary_totals
+
+logger = logging.getLogger(__name__)
+
+
+def branch_report(branch_id, start=None, end=None, bucket=None, group_by=None):
+    """Summary (and optional series) for one branch, under its own context"""
+    with branch_context(branch_id):
+        report = {'summary': summary_totals(branch_id, start, end)}
+        if bucket:
+            report['series'] = sales_series(branch_id, bucket, group_by, start, end)
+    return report
+
+
+def _worker(branch_queue, results, errors, options):
+    # One long-lived connection per worker thread, returned when the queue is drained
+    try:
+        while True:
+            try:
+                branch_id = branch_queue.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            try:
+                report = branch_report(branch_id, **options)
+                report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                results[str(branch_id)] = report
+            except Exception as e:
+                errors[str(branch_id)] = str(e)
+    finally:
+        connections.close_all()
+
+
+def merge_reports(reports, group_by=None):
+    """Chain-wide totals and series from per-branch reports"""
+    transactions = 0
+    revenue = Decimal('0')
+    series = {}
+    for report in reports:
+        summary = report['summary']
+        transactions += summary['total_transactions']
+        revenue += Decimal(summary['total_revenue'])
+        for point in report.get('series', []):
+            key = (point['bucket'], point.get(group_by)) if group_by else (point['bucket'],)
+            merged = series.setdefault(key, {
+                'total_transactions': 0, 'total_revenue': Decimal('0'), 'transaction_count': 0
+            })
+            merged['total_transactions'] += point['total_transactions']
+            merged['total_revenue'] += Decimal(point['total_revenue'])
+            merged['transaction_count'] += point['transaction_count']
+
+    merged_series = []
+    for key in sorted(series, key=lambda k: tuple('' if part is None else part for part in k)):
+        point = {'bucket': key[0]}
+        if group_by:
+            point[group_by] = key[1]
+        values = series[key]
+        point.update({
+            'total_transactions': values['total_transactions'],
+            'total_revenue': str(values['total_revenue']),
+            'transaction_count': values['transaction_count']
+        })
+        merged_series.append(point)
+
+    return {
+        'total_transactions': transactions,
+        'total_revenue': str(revenue),
+        'avg_amount': str(revenue / transactions) if transactions else '0',
+    }, merged_series
+
+
+def hq_report(branch_ids, start=None, end=None, bucket=None, group_by=None, workers=None):
+    """Run branch_report() for every branch concurrently and merge the results"""
+    workers = workers or settings.HQ_REPORT_WORKERS
+    branch_ids = [str(b) for b in branch_ids]
+    options = {'start': start, 'end': end, 'bucket': bucket, 'group_by': group_by}
+
+    logger.info('HQ report over %d branches (%d workers, range %s..%s)',
+                len(branch_ids), workers, start, end)
+
+    branch_queue = queue.Queue()
+    for branch_id in branch_ids:
+        branch_queue.put(branch_id)
+    results, errors = {}, {}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(min(workers, len(branch_ids))):
+            executor.submit(_worker, branch_queue, results, errors, options)
+    elapsed = time.perf_counter() - started
+
+    summary, series = merge_reports(results.values(), group_by)
+    report = {
+        'branches': len(branch_ids),
+        'succeeded': len(results),
+        'failed': errors,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'summary': summary,
+        'per_branch': results,
+    }
+    if bucket:
+        report['bucket'] = bucket
+        report['group_by'] = group_by
+        report['series'] = series
+    return report
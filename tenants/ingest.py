@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .context import same_branch
+from .models import Sales
+from .response_cache import invalidate_branch_responses
+
+# Columns refreshed when a record hits an existing (branch_id, date, product_category)
+UPSERT_FIELDS = ['amount', 'transaction_count', 'notes']
+
+
+def _clean(name, value):
+    return Sales._meta.get_field(name).clean(value, None)
+
+
+def build_sale(record, branch_id):
+    """Validate one incoming record and return an unsaved Sales row.
+
+    Raises ValidationError with a client-facing message.
+    """
+    if not isinstance(record, dict):
+        raise ValidationError('Record must be an object')
+
+    record_branch = record.get('branch_id')
+    if record_branch is not None and not same_branch(record_branch, branch_id):
+        # RLS would reject it anyway; report it per row instead of failing the batch
+        raise ValidationError('Branch mismatch')
+
+    if 'date' not in record or 'amount' not in record:
+        raise ValidationError('date and amount are required')
+
+    return Sales(
+        branch_id=branch_id,
+        date=_clean('date', record['date']),
+        amount=_clean('amount', str(record['amount'])),
+        transaction_count=_clean('transaction_count', record.get('transaction_count', 1)),
+        product_category=_clean('product_category', record.get('product_category', '')),
+        notes=_clean('notes', record.get('notes', '')),
+    )
+
+
+def build_sales(records, branch_id):
+    """Validate records, returning (sales, errors).
+
+    Records repeating a (date, product_category) key are collapsed to the last
+    one: a single INSERT ... ON CONFLICT DO UPDATE cannot touch a row twice.
+    """
+    by_key = {}
+    errors = []
+    for index, record in enumerate(records):
+        try:
+            sale = build_sale(record, branch_id)
+        except ValidationError as e:
+            errors.append({'index': index, 'error': '; '.join(e.messages)})
+            continue
+
+        key = (sale.date, sale.product_category)
+        if key in by_key:
+            errors.append({
+                'index': by_key[key][0],
+                'error': f'Superseded by record {index} with the same date and product_category'
+            })
+        by_key[key] = (index, sale)
+
+    return [sale for _, sale in by_key.values()], errors
+
+
+def upsert_sales(sales):
+    """Insert or update sales on the (branch_id, date, product_category) key.
+
+    Retrying the same payload is idempotent. Runs under the caller's branch
+    context, so the RLS policy checks every row.
+    """
+    with transaction.atomic():
+        Sales.objects.bulk_create(
+            sales,
+            batch_size=settings.SALES_BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['branch_id', 'date', 'product_category'],
+            update_fields=UPSERT_FIELDS,
+        )
+        # bulk_create sends no signals
+        for branch_id in {sale.branch_id for sale in sales}:
+            invalidate_branch_responses(branch_id)
+    return len(sales)
+
+
+def insert_sales(sales):
+    """Insert new sales, skipping any whose (branch_id, date, product_category) exists.
+
+    Returns the ids actually inserted, so callers can report the rest as
+    conflicts the way Sales.objects.create() would. Runs under the caller's
+    branch context.
+    """
+    with transaction.atomic():
+        Sales.objects.bulk_create(sales, batch_size=settings.SALES_BULK_BATCH_SIZE, ignore_conflicts=True)
+        # ids are generated client-side; ours exist only if the insert happened
+        inserted = set(Sales.objects.filter(id__in=[sale.id for sale in sales]).values_list('id', flat=True))
+        for branch_id in {sale.branch_id for sale in sales if sale.id in inserted}:
+            invalidate_branch_responses(branch_id)
+    return inserted
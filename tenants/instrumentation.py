@@ -0,0 +1,217 @@
+"""Per-request database instrumentation.
+
+BranchMiddleware installs a QueryTimer on the request's connection with
+connection.execute_wrapper() for the whole request, so the branch context
+statements (set_config / activate_branch_context / reset) are measured
+alongside the view's own queries. Each request then gets a Server-Timing
+header and is folded into per-branch, per-endpoint histograms that
+metrics_text() renders in the Prometheus text format.
+
+The registry is per worker process; scrape every worker (or run a single
+worker) to see the whole picture. Branches are labelled with a keyed digest
+of their id, never the id itself: the id is what requests authenticate with.
+"""
+import threading
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.crypto import constant_time_compare, salted_hmac
+from .context import CONTEXT_TAG
+
+# Histogram upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+OVERFLOW_BRANCH = 'other'
+
+
+class QueryTimer:
+    """execute_wrapper callable that accumulates one request's DB work"""
+
+    def __init__(self):
+        self.queries = 0
+        self.round_trips = 0
+        self.db_time = 0.0
+        self.context_queries = 0
+        self.context_time = 0.0
+        self._depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self._depth -= 1
+            elapsed = time.perf_counter() - start
+            self.round_trips += 1
+            self.queries += len(params) if many and isinstance(params, (list, tuple)) else 1
+            # A lazily bound context runs nested inside the first query's call
+            if not self._depth:
+                self.db_time += elapsed
+            # Statements issued by the branch context machinery rather than the view
+            if sql.startswith(CONTEXT_TAG):
+                self.context_queries += 1
+                self.context_time += elapsed
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+class RequestMetrics:
+    """Per-(branch, endpoint) request and DB histograms plus query counters.
+
+    At most ``max_branches`` distinct branches get their own label; later
+    ones are reported as branch="other" to bound the series count.
+    """
+
+    def __init__(self, max_branches=1000):
+        self.max_branches = max_branches
+        self._series = {}
+        self._branches = set()
+        self._lock = threading.Lock()
+
+    def record(self, branch, endpoint, duration, timer):
+        with self._lock:
+            if branch not in self._branches:
+                if len(self._branches) < self.max_branches:
+                    self._branches.add(branch)
+                else:
+                    branch = OVERFLOW_BRANCH
+            series = self._series.get((branch, endpoint))
+            if series is None:
+                series = self._series[(branch, endpoint)] = {
+                    'request': Histogram(),
+                    'db': Histogram(),
+                    'queries': 0,
+                    'round_trips': 0,
+                    'context_queries': 0,
+                    'context_seconds': 0.0,
+                }
+            series['request'].observe(duration)
+            series['db'].observe(timer.db_time)
+            series['queries'] += timer.queries
+            series['round_trips'] += timer.round_trips
+            series['context_queries'] += timer.context_queries
+            series['context_seconds'] += timer.context_time
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self._branches.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            series = sorted(self._series.items())
+            lines = []
+            for name, key, help_text in (
+                ('tenant_request_duration_seconds', 'request', 'Request duration inside BranchMiddleware'),
+                ('tenant_db_duration_seconds', 'db', 'Database time per request'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (branch, endpoint), values in series:
+                    labels = f'branch="{branch}",endpoint="{endpoint}"'
+                    histogram = values[key]
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+            for name, key, help_text in (
+                ('tenant_db_queries_total', 'queries', 'SQL statements executed'),
+                ('tenant_db_round_trips_total', 'round_trips', 'Database round trips'),
+                ('tenant_context_queries_total', 'context_queries', 'Branch context SET/reset statements'),
+                ('tenant_context_seconds_total', 'context_seconds', 'Time spent in branch context statements'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (branch, endpoint), values in series:
+                    value = values[key]
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{{branch="{branch}",endpoint="{endpoint}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+_config = getattr(settings, 'REQUEST_METRICS', {})
+request_metrics = RequestMetrics(max_branches=_config.get('MAX_BRANCHES', 1000))
+
+
+def metrics_enabled():
+    return _config.get('ENABLED', True)
+
+
+def start_request(request):
+    """Begin timing the request and wrap the connection it reads from"""
+    if not metrics_enabled():
+        return
+    conn = connections[getattr(request, 'db_alias', DEFAULT_DB_ALIAS)]
+    request._db_timer = QueryTimer()
+    request._db_timer_wrapper = conn.execute_wrapper(request._db_timer)
+    request._db_timer_wrapper.__enter__()
+    request._db_timer_start = time.perf_counter()
+
+
+def finish_request(request, response=None):
+    """Remove the wrapper, record the request and add Server-Timing"""
+    timer = getattr(request, '_db_timer', None)
+    if timer is None:
+        return
+    duration = time.perf_counter() - request._db_timer_start
+    request._db_timer_wrapper.__exit__(None, None, None)
+    del request._db_timer, request._db_timer_wrapper
+
+    match = getattr(request, 'resolver_match', None)
+    endpoint = match.route if match else 'unmatched'
+    branch = branch_label(getattr(request, 'branch_id', None))
+    request_metrics.record(branch, endpoint, duration, timer)
+
+    if response is not None and _config.get('SERVER_TIMING', True):
+        response['Server-Timing'] = server_timing(timer, duration)
+
+
+def branch_label(branch_id):
+    """Stable, non-reversible metrics label for a branch id"""
+    if not branch_id:
+        return 'none'
+    return salted_hmac('tenants.metrics.branch', str(branch_id).lower()).hexdigest()[:16]
+
+
+def server_timing(timer, duration):
+    return ', '.join([
+        f'db;dur={timer.db_time * 1000:.2f};desc="{timer.queries} queries, {timer.round_trips} round trips"',
+        f'ctx;dur={timer.context_time * 1000:.2f};desc="{timer.context_queries} branch context statements"',
+        f'total;dur={duration * 1000:.2f}',
+    ])
+
+
+def metrics_access_allowed(request):
+    """/metrics/ is for the scraper only: a bearer token, else loopback/ALLOWED_IPS"""
+    token = _config.get('TOKEN')
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return header.startswith('Bearer ') and constant_time_compare(header[len('Bearer '):], token)
+    return request.META.get('REMOTE_ADDR') in _config.get('ALLOWED_IPS', ('127.0.0.1', '::1'))
+
+
+def metrics_text():
+    return request_metrics.render()
@@ -0,0 +1,318 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from tenants.context import branch_context
+from tenants.models import Branch, Sales
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+ENDPOINTS = {
+    'branches': '/api/branches/',
+    'sales': '/api/sales/?limit=50',
+    'sales-summary': '/api/sales-summary/',
+}
+
+CATEGORIES = ['主餐', '飲料', '配菜', '甜點', '套餐']
+
+# What each endpoint reads, with the branch filter spelled out. --compare-no-rls
+# runs these under the branch context (RLS) and again on a dedicated
+# BYPASSRLS connection, so both sides return the same rows; RLS itself is
+# never switched off for the live tables.
+BASELINE_QUERIES = {
+    'branches': "SELECT id, name, code FROM tenants_branch WHERE is_active AND id = %s",
+    'sales': (
+        "SELECT id, date, amount, transaction_count, product_category, notes FROM tenants_sales "
+        "WHERE branch_id = %s ORDER BY date DESC, id DESC LIMIT 50"
+    ),
+    'sales-summary': (
+        "SELECT SUM(sales_count), SUM(total_amount) FROM tenants_salesdailyrollup WHERE branch_id = %s"
+    ),
+}
+
+BYPASS_ALIAS = 'bench_bypass'
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+class Command(BaseCommand):
+    help = 'RLS 端點效能測試：建立 N 間分店 × M 筆銷售，並發請求並回報吞吐量與 p50/p95/p99'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branches', type=int, default=10, help='建立的分店數 (預設: 10)')
+        parser.add_argument('--sales', type=int, default=1000, help='每間分店的銷售筆數 (預設: 1000)')
+        parser.add_argument('--requests', type=int, default=500, help='每個端點的請求數 (預設: 500)')
+        parser.add_argument('--concurrency', type=int, default=8, help='並發數 (預設: 8)')
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            choices=list(ENDPOINTS),
+            help='只測試指定端點 (可重複指定，預設: 全部)',
+        )
+        parser.add_argument(
+            '--url',
+            help='對執行中的伺服器發送請求 (例如 http://localhost:8000)；預設使用 Django 測試 Client',
+        )
+        parser.add_argument(
+            '--compare-no-rls',
+            action='store_true',
+            help='以相同查詢 (明確 branch_id 條件) 分別在 RLS 與 BYPASSRLS 專用連線上執行以量測 RLS 成本',
+        )
+        parser.add_argument(
+            '--bypass-role',
+            help='--compare-no-rls 專用連線切換的 BYPASSRLS 角色 (預設: 連線使用者本身)',
+        )
+        parser.add_argument('--output', help='將 JSON 結果寫入檔案')
+        parser.add_argument('--keep-data', action='store_true', help='保留測試資料')
+        parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        endpoints = options.get('endpoint') or list(ENDPOINTS)
+
+        if options['branches'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--branches 與 --concurrency 必須大於 0')
+
+        self.stdout.write(self.style.SUCCESS('🚀 開始 RLS 效能測試...'))
+        branch_ids = self.seed_data(options['branches'], options['sales'])
+
+        results = {
+            'started_at': timezone.now().isoformat(),
+            'config': {
+                'branches': options['branches'],
+                'sales_per_branch': options['sales'],
+                'requests_per_endpoint': options['requests'],
+                'concurrency': options['concurrency'],
+                'target': options.get('url') or 'django.test.Client',
+                'branch_context_scope': getattr(settings, 'BRANCH_CONTEXT_SCOPE', 'session'),
+                'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+                'pool': bool(settings.DATABASES['default'].get('OPTIONS', {}).get('pool')),
+            },
+            'rls': {},
+        }
+
+        if options.get('url'):
+            self.stdout.write(self.style.WARNING(
+                '⚠️  請確認伺服器已停用回應快取 (RESPONSE_CACHE_ENABLED=False)，否則量測的是快取命中'
+            ))
+
+        try:
+            self.stdout.write('\n🔒 RLS 啟用')
+            # Every request must reach the database, in both runs
+            with override_settings(RESPONSE_CACHE={**getattr(settings, 'RESPONSE_CACHE', {}), 'ENABLED': False}):
+                results['rls'] = self.run_suite(endpoints, branch_ids)
+
+            if options['compare_no_rls']:
+                self.setup_bypass_connection(options.get('bypass_role'))
+                self.stdout.write('\n🔒 查詢層級：RLS 上下文')
+                results['rls_queries'] = self.run_query_suite(endpoints, branch_ids, bypass=False)
+                self.stdout.write('\n🔓 查詢層級：BYPASSRLS 專用連線')
+                results['no_rls'] = self.run_query_suite(endpoints, branch_ids, bypass=True)
+                results['rls_overhead'] = self.overhead(results['rls_queries'], results['no_rls'])
+        finally:
+            if not options['keep_data']:
+                self.cleanup(branch_ids)
+
+        if options.get('output'):
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"\n📝 結果已寫入 {options['output']}")
+
+        self.stdout.write(self.style.SUCCESS('\n🎉 效能測試完成'))
+
+    def seed_data(self, branch_count, sales_count):
+        """建立測試分店與銷售資料 (每間分店在自己的 RLS 上下文中寫入)"""
+        self.stdout.write(f'\n🔧 建立 {branch_count} 間分店 × {sales_count} 筆銷售...')
+        run_id = uuid.uuid4().hex[:6]
+        today = timezone.localdate()
+        branch_ids = []
+
+        for i in range(branch_count):
+            branch_id = uuid.uuid4()
+            with branch_context(branch_id):
+                Branch.objects.create(
+                    id=branch_id,
+                    name=f'效能測試分店 {i + 1}',
+                    code=f'BN{run_id}{i:05d}'[:20],
+                    address='效能測試',
+                    phone='00-0000-0000',
+                )
+                # One row per (date, category) keeps the unique constraint satisfied
+                Sales.objects.bulk_create([
+                    Sales(
+                        branch_id=branch_id,
+                        date=today - timedelta(days=n // len(CATEGORIES)),
+                        product_category=CATEGORIES[n % len(CATEGORIES)],
+                        amount=Decimal(self.random.randint(1000, 50000)) / 100,
+                        transaction_count=self.random.randint(1, 40),
+                    )
+                    for n in range(sales_count)
+                ], batch_size=1000)
+            branch_ids.append(str(branch_id))
+
+        return branch_ids
+
+    def cleanup(self, branch_ids):
+        self.stdout.write('\n🧹 清理測試資料...')
+        for branch_id in branch_ids:
+            with branch_context(branch_id):
+                Sales.objects.all().delete()
+                Branch.objects.filter(id=branch_id).delete()
+
+    def setup_bypass_connection(self, role):
+        """Register a dedicated, non-pooled connection alias that bypasses RLS"""
+        config = dict(connections.settings['default'])
+        config['OPTIONS'] = {k: v for k, v in config.get('OPTIONS', {}).items() if k != 'pool'}
+        connections.settings[BYPASS_ALIAS] = config
+        self.bypass_role = role
+        try:
+            with connections[BYPASS_ALIAS].cursor() as cursor:
+                self.assume_bypass_role(cursor)
+                cursor.execute("SELECT rolsuper OR rolbypassrls FROM pg_roles WHERE rolname = current_user")
+                row = cursor.fetchone()
+        finally:
+            connections[BYPASS_ALIAS].close()
+        if not row or not row[0]:
+            raise CommandError('--compare-no-rls 需要 superuser 或 BYPASSRLS 角色；請以 --bypass-role 指定')
+
+    def assume_bypass_role(self, cursor):
+        if self.bypass_role:
+            # Session-level on the dedicated connection only
+            cursor.execute("SELECT set_config('role', %s, false)", [self.bypass_role])
+
+    def run_suite(self, endpoints, branch_ids):
+        suite = {}
+        for name in endpoints:
+            path = ENDPOINTS[name]
+            suite[name] = self.run_endpoint(lambda share: self.drive(path, share), branch_ids)
+            self.report(name, suite[name])
+        return suite
+
+    def run_query_suite(self, endpoints, branch_ids, bypass):
+        suite = {}
+        for name in endpoints:
+            sql = BASELINE_QUERIES[name]
+            suite[name] = self.run_endpoint(lambda share: self.drive_query(sql, share, bypass), branch_ids)
+            self.report(name, suite[name])
+        return suite
+
+    def report(self, name, stats):
+        self.stdout.write(
+            f"   {name:<14} {stats['throughput_rps']:>9.1f} req/s  "
+            f"p50 {stats['p50_ms']:.2f} ms  p95 {stats['p95_ms']:.2f} ms  "
+            f"p99 {stats['p99_ms']:.2f} ms  errors {stats['errors']}"
+        )
+
+    def run_endpoint(self, drive, branch_ids):
+        total = self.options['requests']
+        concurrency = self.options['concurrency']
+        # Interleave branches so consecutive requests switch context
+        plan = [self.random.choice(branch_ids) for _ in range(total)]
+        shares = [plan[i::concurrency] for i in range(concurrency)]
+
+        started = time.perf_counter()
+        with override_settings(ALLOWED_HOSTS=['testserver', 'localhost', *settings.ALLOWED_HOSTS]):
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                outcomes = list(executor.map(drive, shares))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for samples, _ in outcomes for latency in samples)
+        errors = sum(errors for _, errors in outcomes)
+        return {
+            'requests': total,
+            'errors': errors,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        }
+
+    def drive_query(self, sql, branch_ids, bypass):
+        """Run one worker's share of an endpoint's query; each in its own transaction"""
+        latencies, errors = [], 0
+        try:
+            if bypass:
+                with connections[BYPASS_ALIAS].cursor() as cursor:
+                    self.assume_bypass_role(cursor)
+            for branch_id in branch_ids:
+                start = time.perf_counter()
+                try:
+                    if bypass:
+                        with transaction.atomic(using=BYPASS_ALIAS):
+                            with connections[BYPASS_ALIAS].cursor() as cursor:
+                                cursor.execute(sql, [branch_id])
+                                cursor.fetchall()
+                    else:
+                        with branch_context(branch_id):
+                            with connections['default'].cursor() as cursor:
+                                cursor.execute(sql, [branch_id])
+                                cursor.fetchall()
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+        return latencies, errors
+
+    def drive(self, path, branch_ids):
+        """Send one worker's share of requests; returns (latencies, errors)"""
+        latencies, errors = [], 0
+        client = None if self.options.get('url') else Client()
+        try:
+            for branch_id in branch_ids:
+                start = time.perf_counter()
+                status = self.send(client, path, branch_id)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+        finally:
+            connections.close_all()
+        return latencies, errors
+
+    def send(self, client, path, branch_id):
+        if client is not None:
+            return client.get(path, headers={'X-Branch-ID': branch_id}).status_code
+
+        request = urllib.request.Request(
+            self.options['url'].rstrip('/') + path,
+            headers={'X-Branch-ID': branch_id},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except urllib.error.URLError:
+            return 0
+
+    def overhead(self, with_rls, without_rls):
+        overhead = {}
+        for name, stats in with_rls.items():
+            base = without_rls.get(name)
+            if not base:
+                continue
+            overhead[name] = {
+                key: round(stats[key] - base[key], 3) for key in ('p50_ms', 'p95_ms', 'p99_ms')
+            }
+            if base['throughput_rps']:
+                overhead[name]['throughput_change_pct'] = round(
+                    (stats['throughput_rps'] - base['throughput_rps']) / base['throughput_rps'] * 100, 2
+                )
+        return overhead
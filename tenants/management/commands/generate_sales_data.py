@@ -0,0 +1,229 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from tenants.rollup import rebuild_rollup
+from datetime import date, timedelta
+import io
+import multiprocessing
+import random
+import time
+import uuid
+
+SALES_COLUMNS = [
+    'id', 'branch_id', 'date', 'amount', 'transaction_count',
+    'product_category', 'notes', 'created_at',
+]
+BRANCH_COLUMNS = [
+    'id', 'name', 'code', 'address', 'phone', 'is_active', 'created_at', 'updated_at',
+]
+ROLLUP_TRIGGER = 'tenants_sales_rollup_insert'
+
+# uuid4 version/variant bits, applied to 128 random bits
+UUID_CLEAR = ~((0xf << 76) | (0x3 << 62))
+UUID_SET = (0x4 << 76) | (0x2 << 62)
+
+
+def random_uuid(rng):
+    """Version-4 UUID text from a seeded generator (much faster than uuid.uuid4())"""
+    return '%032x' % ((rng.getrandbits(128) & UUID_CLEAR) | UUID_SET)
+
+
+def copy_from_buffer(cursor, table, columns, buffer):
+    """COPY a CSV buffer into ``table`` with psycopg 3 or psycopg2"""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        buffer.seek(0)
+        raw.copy_expert(sql, buffer)
+    else:
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def branch_plan(options, branch_index):
+    """Deterministic per-branch generation parameters"""
+    capacity = options['days'] * options['categories']
+    rows = min(capacity, options['rows_per_branch'][branch_index])
+    return capacity, rows
+
+
+def generate_branch_sales(options, branch_index, branch_id, buffer):
+    """Write one branch's sales as CSV; returns the row count.
+
+    Each row is a distinct (date, category) slot, so the unique
+    (branch_id, date, product_category) constraint always holds.
+    """
+    rng = random.Random(options['seed'] * 1_000_003 + branch_index)
+    capacity, rows = branch_plan(options, branch_index)
+    if rows == 0:
+        return 0
+
+    categories = options['category_names']
+    first_date = options['start_date']
+    created_at = options['created_at']
+    # Branch-level scale so big branches also sell more per row
+    base = rng.lognormvariate(9.0, 0.6)
+    slots = range(capacity) if rows == capacity else rng.sample(range(capacity), rows)
+
+    write = buffer.write
+    for slot in slots:
+        day, category = divmod(slot, len(categories))
+        amount = base * rng.lognormvariate(0.0, 0.35)
+        # notes is NOT NULL: an unquoted empty CSV field would COPY as NULL
+        write(
+            f"{random_uuid(rng)},{branch_id},{(first_date + timedelta(days=day)).isoformat()},"
+            f"{amount:.2f},{rng.randint(1, 60)},{categories[category]},\"\",{created_at}\n"
+        )
+    return rows
+
+
+def load_worker(args):
+    """Process entry point: generate and COPY the sales of a slice of branches"""
+    options, branch_slice = args
+    buffer = io.StringIO()
+    pending = 0
+    loaded = 0
+    try:
+        with connection.cursor() as cursor:
+            for branch_index, branch_id in branch_slice:
+                pending += generate_branch_sales(options, branch_index, branch_id, buffer)
+                if pending >= options['batch_rows']:
+                    copy_from_buffer(cursor, 'tenants_sales', SALES_COLUMNS, buffer)
+                    loaded += pending
+                    pending = 0
+                    buffer = io.StringIO()
+            if pending:
+                copy_from_buffer(cursor, 'tenants_sales', SALES_COLUMNS, buffer)
+                loaded += pending
+    finally:
+        connections.close_all()
+    return loaded
+
+
+class Command(BaseCommand):
+    help = '以 COPY FROM STDIN 平行產生大量分店與銷售測試資料 (需使用可略過 RLS 的資料庫角色)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branches', type=int, default=1000, help='分店數 (預設: 1000)')
+        parser.add_argument('--rows', type=int, default=1_000_000, help='銷售總筆數目標 (預設: 1000000)')
+        parser.add_argument('--days', type=int, default=730, help='日期跨度天數 (預設: 730)')
+        parser.add_argument('--categories', type=int, default=20, help='產品類別數 (預設: 20)')
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.0,
+            help='分店銷售量的 Zipf 偏斜指數，0 表示平均分配 (預設: 1.0)',
+        )
+        parser.add_argument('--start-date', help='第一天 YYYY-MM-DD (預設: 今天往前 --days 天)')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='平行工作程序數')
+        parser.add_argument('--batch-rows', type=int, default=200_000, help='每次 COPY 的筆數 (預設: 200000)')
+        parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+        parser.add_argument(
+            '--skip-rollup',
+            action='store_true',
+            help='載入期間停用彙總觸發器，完成後一次重建 (需要資料表擁有者權限)',
+        )
+
+    def handle(self, *args, **options):
+        if min(options['branches'], options['days'], options['categories'], options['workers']) < 1:
+            raise CommandError('--branches、--days、--categories、--workers 必須大於 0')
+        self.check_role()
+
+        start_date = (
+            date.fromisoformat(options['start_date']) if options.get('start_date')
+            else timezone.localdate() - timedelta(days=options['days'])
+        )
+        plan = {
+            'seed': options['seed'],
+            'days': options['days'],
+            'categories': options['categories'],
+            'category_names': [f'類別{i:03d}' for i in range(options['categories'])],
+            'start_date': start_date,
+            'created_at': timezone.now().isoformat(),
+            'batch_rows': options['batch_rows'],
+            'rows_per_branch': self.distribute(options),
+        }
+        capacity = options['days'] * options['categories']
+        target = sum(min(capacity, rows) for rows in plan['rows_per_branch'])
+        if target < options['rows']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  唯一鍵 (分店, 日期, 類別) 容量不足，實際產生 {target} 筆；請增加 --days 或 --categories"
+            ))
+
+        started = time.perf_counter()
+        branch_ids = self.load_branches(options['branches'], options['seed'])
+        self.stdout.write(f"✅ 已建立 {len(branch_ids)} 間分店")
+
+        if options['skip_rollup']:
+            self.set_rollup_trigger(enabled=False)
+        try:
+            loaded = self.load_sales(plan, branch_ids, options['workers'])
+        finally:
+            if options['skip_rollup']:
+                self.set_rollup_trigger(enabled=True)
+
+        if options['skip_rollup']:
+            self.stdout.write('🔄 重建每日彙總...')
+            rebuild_rollup()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 已載入 {loaded} 筆銷售資料，耗時 {elapsed:.1f} 秒 ({loaded / elapsed:,.0f} 筆/秒)"
+        ))
+
+    def check_role(self):
+        # Postgres rejects COPY FROM into tables with row-level security
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rolsuper OR rolbypassrls FROM pg_roles WHERE rolname = current_user")
+            if not cursor.fetchone()[0]:
+                raise CommandError('COPY 無法寫入啟用 RLS 的資料表；請使用 superuser 或 BYPASSRLS 角色執行')
+
+    def distribute(self, options):
+        """Per-branch row targets following a Zipf(skew) distribution"""
+        weights = [1.0 / (rank ** options['skew']) for rank in range(1, options['branches'] + 1)]
+        total = sum(weights)
+        rows = [int(options['rows'] * w / total) for w in weights]
+        # Hand out the rounding remainder to the largest branches
+        for i in range(options['rows'] - sum(rows)):
+            rows[i % len(rows)] += 1
+        random.Random(options['seed']).shuffle(rows)
+        return rows
+
+    def load_branches(self, count, seed):
+        rng = random.Random(seed)
+        run_id = uuid.uuid4().hex[:6]
+        now = timezone.now().isoformat()
+        buffer = io.StringIO()
+        branch_ids = []
+        for i in range(count):
+            branch_id = random_uuid(rng)
+            branch_ids.append(branch_id)
+            buffer.write(
+                f"{branch_id},產生分店 {i + 1},GEN{run_id}{i:07d},測試地址,00-0000-0000,t,{now},{now}\n"
+            )
+        with connection.cursor() as cursor:
+            copy_from_buffer(cursor, 'tenants_branch', BRANCH_COLUMNS, buffer)
+        return branch_ids
+
+    def load_sales(self, plan, branch_ids, workers):
+        indexed = list(enumerate(branch_ids))
+        # Small slices keep the workers evenly loaded despite the skew
+        slice_size = max(1, len(indexed) // (workers * 8))
+        slices = [(plan, indexed[i:i + slice_size]) for i in range(0, len(indexed), slice_size)]
+
+        # Forked workers must not share the parent's socket
+        connections.close_all()
+
+        loaded = 0
+        started = time.perf_counter()
+        with multiprocessing.Pool(processes=workers) as pool:
+            for count in pool.imap_unordered(load_worker, slices):
+                loaded += count
+                rate = loaded / (time.perf_counter() - started)
+                self.stdout.write(f"   已載入 {loaded:,} 筆 ({rate:,.0f} 筆/秒)")
+        return loaded
+
+    def set_rollup_trigger(self, enabled):
+        action = 'ENABLE' if enabled else 'DISABLE'
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE tenants_sales {action} TRIGGER {ROLLUP_TRIGGER}")
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from tenants.hq import hq_report
+from tenants.models import Branch
+from tenants.reports import BUCKETS, GROUP_BY_COLUMNS
+from datetime import datetime
+import json
+import uuid
+
+
+class Command(BaseCommand):
+    help = '總部跨分店銷售報表：以執行緒池平行查詢各分店 (每個分店使用自己的 RLS 上下文)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--branch',
+            action='append',
+            default=[],
+            help='分店 ID (可重複指定)；未指定時列出所有啟用分店，需使用可略過 RLS 的資料庫角色',
+        )
+        parser.add_argument('--start', help='起始日期 YYYY-MM-DD')
+        parser.add_argument('--end', help='結束日期 YYYY-MM-DD')
+        parser.add_argument('--bucket', choices=BUCKETS, help='時間區間彙總')
+        parser.add_argument('--group-by', choices=list(GROUP_BY_COLUMNS), help='分組欄位 (需搭配 --bucket)')
+        parser.add_argument('--workers', type=int, help='平行查詢的執行緒數 (預設: HQ_REPORT_WORKERS)')
+        parser.add_argument('--output', help='將完整 JSON 報表寫入檔案')
+
+    def handle(self, *args, **options):
+        try:
+            start = self.parse_date(options.get('start'))
+            end = self.parse_date(options.get('end'))
+        except ValueError:
+            raise CommandError('日期格式錯誤，請使用 YYYY-MM-DD')
+        if options.get('group_by') and not options.get('bucket'):
+            raise CommandError('--group-by 需要搭配 --bucket')
+
+        branch_ids = options['branch']
+        for branch_id in branch_ids:
+            try:
+                uuid.UUID(branch_id)
+            except ValueError:
+                raise CommandError(f'無效的分店 ID: {branch_id}')
+        if not branch_ids:
+            branch_ids = list(Branch.objects.filter(is_active=True).values_list('id', flat=True))
+            if not branch_ids:
+                raise CommandError('看不到任何分店；受 RLS 限制的角色請使用 --branch 指定分店')
+
+        self.stdout.write(f'📊 產生 {len(branch_ids)} 間分店的總部報表...')
+        report = hq_report(
+            branch_ids,
+            start=start,
+            end=end,
+            bucket=options.get('bucket'),
+            group_by=options.get('group_by'),
+            workers=options.get('workers'),
+        )
+
+        summary = report['summary']
+        self.stdout.write(f"   交易筆數: {summary['total_transactions']}")
+        self.stdout.write(f"   總營收: {summary['total_revenue']}")
+        self.stdout.write(f"   平均金額: {summary['avg_amount']}")
+        self.stdout.write(f"   耗時: {report['elapsed_ms']} ms")
+
+        for branch_id, error in report['failed'].items():
+            self.stdout.write(self.style.ERROR(f'❌ 分店 {branch_id}: {error}'))
+
+        if options.get('output'):
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"   報表已寫入 {options['output']}")
+
+        if report['failed']:
+            raise CommandError(f"{len(report['failed'])} 間分店查詢失敗")
+        self.stdout.write(self.style.SUCCESS(f"✅ 完成 {report['succeeded']} 間分店"))
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%d').date()
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from tenants.context import branch_context
+from tenants.rollup import rebuild_rollup
+import uuid
+
+
+class Command(BaseCommand):
+    help = '重建每日銷售彙總表 (tenants_salesdailyrollup)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--branch',
+            action='append',
+            default=[],
+            help='只重建指定分店 (可重複指定)；未指定時需使用可略過 RLS 的資料庫角色',
+        )
+
+    def handle(self, *args, **options):
+        branch_ids = options['branch']
+
+        for branch_id in branch_ids:
+            try:
+                uuid.UUID(branch_id)
+            except ValueError:
+                raise CommandError(f'無效的分店 ID: {branch_id}')
+
+        if not branch_ids:
+            rows = rebuild_rollup()
+            self.stdout.write(self.style.SUCCESS(f'✅ 已重建所有可見分店的彙總資料: {rows} 筆'))
+            if rows == 0:
+                self.stdout.write(self.style.WARNING(
+                    '⚠️  沒有寫入任何資料；若資料庫角色受 RLS 限制，請使用 --branch 指定分店'
+                ))
+            return
+
+        for branch_id in branch_ids:
+            with branch_context(branch_id):
+                rows = rebuild_rollup()
+            self.stdout.write(self.style.SUCCESS(f'✅ 分店 {branch_id}: {rows} 筆彙總資料'))
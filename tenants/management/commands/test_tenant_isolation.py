@@ -1,19 +1,187 @@
-from django.core.management.base import BaseCommand
-from django.db import connection
-from tenants.models import Tenant, Product
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+from tenants.context import BRANCH_SETTING, branch_context
+from tenants.middleware import BranchMiddleware
+from tenants.models import Branch, Sales
+from collections import Counter
+from datetime import timedelta
 from decimal import Decimal
-import sys
+import multiprocessing
+import random
+import threading
+import time
+import uuid
+
+# Test branches get stable ids so --cleanup can find them again under RLS
+ISOLATION_NAMESPACE = uuid.UUID('7f1c1f5e-2d3b-4c1e-9a55-6b0f3c1d8e21')
+
+CATEGORIES = ['主餐', '飲料', '配菜', '甜點', '套餐']
+
+RLS_TABLES = ['tenants_branch', 'tenants_sales']
+
+COUNTERS = ['requests', 'anonymous', 'foreign_rows', 'foreign_branches', 'context_mismatch', 'short_reads', 'errors']
+
+
+def isolation_branch_id(index):
+    return str(uuid.uuid5(ISOLATION_NAMESPACE, f'branch-{index}'))
+
+
+def isolation_branch_name(index):
+    return f'隔離測試分店 {index + 1}'
+
+
+class Probe:
+    """View stand-in run behind BranchMiddleware: records what the request can see"""
+
+    def __init__(self, limit):
+        self.limit = limit
+
+    def __call__(self, request):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT current_setting(%s, true)", [BRANCH_SETTING])
+            setting = cursor.fetchone()[0] or ''
+        request.isolation_result = {
+            'setting': setting,
+            'sales': [str(b) for b in Sales.objects.values_list('branch', flat=True)[:self.limit]],
+            'branches': [str(b) for b in Branch.objects.values_list('id', flat=True)],
+        }
+        return HttpResponse()
+
+
+def check_probe(stats, expected, result, sales_per_branch, limit):
+    """Compare one probe result with the branch the request was made for"""
+    expected = expected or ''
+    stats['foreign_rows'] += sum(1 for b in result['sales'] if b != expected)
+    stats['foreign_branches'] += sum(1 for b in result['branches'] if b != expected)
+    if result['setting'] != expected:
+        stats['context_mismatch'] += 1
+    if expected and len(result['sales']) != min(sales_per_branch, limit):
+        stats['short_reads'] += 1
+
+
+def middleware_request(factory, middleware, stats, branch_id, options):
+    """One request through BranchMiddleware, then the request_finished cleanup"""
+    headers = {'HTTP_X_BRANCH_ID': branch_id} if branch_id else {}
+    # Outside /api/ so a request without a branch is allowed through
+    request = factory.get('/isolation-probe/', **headers)
+    try:
+        response = middleware(request)
+        if response.status_code != 200:
+            stats['errors'] += 1
+            return
+        check_probe(stats, branch_id, request.isolation_result, options['sales'], options['limit'])
+    finally:
+        # What Django does on request_finished: close or give the connection
+        # back to the pool according to CONN_MAX_AGE / OPTIONS['pool']
+        close_old_connections()
+
+
+def client_request(client, stats, branch_id, sale_ids, options):
+    """One request through the full HTTP stack (URL routing, views, JSON)"""
+    if branch_id:
+        response = client.get(f"/api/sales/?limit={options['limit']}", headers={'X-Branch-ID': branch_id})
+        if response.status_code != 200:
+            stats['errors'] += 1
+            return
+        data = response.json()
+        # branch_name is filled in from request.branch, so check the rows themselves
+        stats['foreign_rows'] += sum(1 for s in data['sales'] if s['id'] not in sale_ids[branch_id])
+        if data['current_branch_id'] != branch_id:
+            stats['context_mismatch'] += 1
+        if data['count'] != min(options['sales'], options['limit']):
+            stats['short_reads'] += 1
+    else:
+        response = client.get('/api/context-status/')
+        if response.status_code != 200:
+            stats['errors'] += 1
+            return
+        data = response.json()
+        stats['foreign_rows'] += data['visibility']['sales']
+        stats['foreign_branches'] += data['visibility']['branches']
+        if data['context']['current_branch_id']:
+            stats['context_mismatch'] += 1
+
+
+def stress_thread(options, branch_ids, sale_ids, seed):
+    """Interleave random branches (and context-less requests) on this thread"""
+    rng = random.Random(seed)
+    stats = Counter()
+    if options['mode'] == 'client':
+        client = Client()
+    else:
+        factory = RequestFactory()
+        middleware = BranchMiddleware(Probe(options['limit']))
+    try:
+        for _ in range(options['requests']):
+            branch_id = None if rng.random() < options['anonymous_ratio'] else rng.choice(branch_ids)
+            stats['requests'] += 1
+            if branch_id is None:
+                stats['anonymous'] += 1
+            try:
+                if options['mode'] == 'client':
+                    client_request(client, stats, branch_id, sale_ids, options)
+                else:
+                    middleware_request(factory, middleware, stats, branch_id, options)
+            except Exception:
+                stats['errors'] += 1
+    finally:
+        connections.close_all()
+    return stats
+
+
+def stress_process(args):
+    """Process entry point: run ``threads`` stress threads and merge their counters"""
+    options, branch_ids, sale_ids, seed = args
+    results = []
+
+    def run(n):
+        results.append(stress_thread(options, branch_ids, sale_ids, seed * 1000 + n))
+
+    with override_settings(ALLOWED_HOSTS=['testserver', *settings.ALLOWED_HOSTS]):
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    connections.close_all()
+    return sum(results, Counter())
+
 
 class Command(BaseCommand):
-    help = '測試租戶隔離功能'
-    
+    help = '測試分店隔離：功能檢查加上多執行緒/多程序壓力測試，回報資料外洩數與吞吐量'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.test_results = []
-        self.tenant1 = None
-        self.tenant2 = None
-    
+        self.throughput = None
+
     def add_arguments(self, parser):
+        parser.add_argument('--branches', type=int, default=8, help='測試分店數 (預設: 8)')
+        parser.add_argument('--sales', type=int, default=20, help='每間分店的銷售筆數 (預設: 20)')
+        parser.add_argument('--threads', type=int, default=8, help='每個程序的執行緒數 (預設: 8)')
+        parser.add_argument('--processes', type=int, default=1, help='程序數 (預設: 1)')
+        parser.add_argument('--requests', type=int, default=500, help='每個執行緒的請求數 (預設: 500)')
+        parser.add_argument(
+            '--mode',
+            choices=['middleware', 'client'],
+            default='middleware',
+            help='middleware: 直接經過 BranchMiddleware；client: 經過完整 HTTP 堆疊 (預設: middleware)',
+        )
+        parser.add_argument(
+            '--anonymous-ratio',
+            type=float,
+            default=0.1,
+            help='不帶分店的請求比例，用來偵測殘留的上下文 (預設: 0.1)',
+        )
+        parser.add_argument('--limit', type=int, default=50, help='每次請求讀取的銷售筆數上限 (預設: 50)')
+        parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+        parser.add_argument('--skip-stress', action='store_true', help='只執行功能檢查')
+        parser.add_argument('--keep-data', action='store_true', help='保留測試資料')
         parser.add_argument(
             '--cleanup',
             action='store_true',
@@ -24,35 +192,46 @@ class Command(BaseCommand):
             action='store_true',
             help='顯示詳細資訊',
         )
-    
+
     def handle(self, *args, **options):
-        self.verbosity = options.get('verbosity', 1)
         self.verbose = options.get('verbose', False)
-        
+        if min(options['branches'], options['threads'], options['processes']) < 1:
+            raise CommandError('--branches、--threads、--processes 必須大於 0')
+        if options['branches'] < 2:
+            raise CommandError('--branches 至少需要 2 間分店才能檢查隔離')
+        branch_ids = [isolation_branch_id(i) for i in range(options['branches'])]
+
         if options.get('cleanup'):
-            self.cleanup_test_data()
+            self.cleanup_test_data(branch_ids)
             return
-        
-        self.stdout.write(self.style.SUCCESS('🚀 開始租戶隔離測試...'))
-        
+
+        self.stdout.write(self.style.SUCCESS('🚀 開始分店隔離測試...'))
+
         try:
-            self.setup_test_data()
-            self.test_basic_isolation()
-            self.test_cross_tenant_access()
-            self.test_without_tenant_context()
+            sale_ids = self.setup_test_data(branch_ids, options['sales'])
+            self.test_basic_isolation(branch_ids, options['sales'])
+            self.test_cross_branch_access(branch_ids)
+            self.test_without_branch_context()
             self.test_rls_policies()
-            self.test_tenant_switching()
-            
+            self.test_branch_switching(branch_ids)
+            if not options['skip_stress']:
+                self.test_concurrent_isolation(branch_ids, sale_ids, options)
+
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'❌ 測試過程中發生錯誤: {str(e)}'))
+            self.test_results.append({'test': '執行錯誤', 'passed': False, 'message': str(e)})
             if self.verbose:
                 import traceback
                 traceback.print_exc()
-        
+
         finally:
-            self.reset_tenant_context()
+            if not options['keep_data']:
+                self.cleanup_test_data(branch_ids)
             self.print_summary()
-    
+
+        if not all(result['passed'] for result in self.test_results):
+            raise CommandError('分店隔離測試失敗')
+
     def log_test(self, test_name, passed, message=""):
         status = "✅ PASSED" if passed else "❌ FAILED"
         self.test_results.append({
@@ -60,224 +239,219 @@ class Command(BaseCommand):
             'passed': passed,
             'message': message
         })
-        
+
         if passed:
             self.stdout.write(self.style.SUCCESS(f"{status}: {test_name}"))
         else:
             self.stdout.write(self.style.ERROR(f"{status}: {test_name}"))
-            
+
         if message:
             self.stdout.write(f"   {message}")
-    
-    def setup_test_data(self):
-        """建立測試資料"""
-        self.stdout.write("\n🔧 建立測試資料...")
-        
-        # 清理現有測試資料
-        Tenant.objects.filter(subdomain__startswith='test').delete()
-        
-        # 建立兩個測試租戶
-        self.tenant1 = Tenant.objects.create(
-            name="測試租戶1",
-            subdomain="test1",
-            is_active=True
-        )
-        self.tenant2 = Tenant.objects.create(
-            name="測試租戶2", 
-            subdomain="test2",
-            is_active=True
-        )
-        
-        self.stdout.write(f"   建立租戶1: {self.tenant1.name} (ID: {self.tenant1.id})")
-        self.stdout.write(f"   建立租戶2: {self.tenant2.name} (ID: {self.tenant2.id})")
-        
-        # 為租戶1建立產品
-        self.set_tenant_context(self.tenant1.id)
-        Product.objects.create(
-            name="租戶1產品A",
-            price=Decimal("100.00"),
-            description="這是租戶1的產品",
-            tenant_id=self.tenant1.id
-        )
-        
-        Product.objects.create(
-            name="租戶1產品B",
-            price=Decimal("200.00"),
-            description="這是租戶1的另一個產品",
-            tenant_id=self.tenant1.id
-        )
-        
-        # 為租戶2建立產品
-        self.set_tenant_context(self.tenant2.id)
-        Product.objects.create(
-            name="租戶2產品C",
-            price=Decimal("150.00"),
-            description="這是租戶2的產品",
-            tenant_id=self.tenant2.id
-        )
-        
-        self.stdout.write("   為租戶1建立2個產品，為租戶2建立1個產品")
-    
-    def set_tenant_context(self, tenant_id):
-        """設定租戶上下文"""
-        with connection.cursor() as cursor:
-            cursor.execute("SET app.current_tenant = %s", [tenant_id])
-    
-    def reset_tenant_context(self):
-        """重設租戶上下文"""
-        with connection.cursor() as cursor:
-            cursor.execute("RESET app.current_tenant")
-    
-    def test_basic_isolation(self):
-        """測試基本的租戶隔離"""
-        self.stdout.write("\n🧪 測試基本租戶隔離...")
-        
-        # 測試租戶1只能看到自己的資料
-        self.set_tenant_context(self.tenant1.id)
-        tenant1_count = Product.objects.count()
-        
-        passed = tenant1_count == 2
-        self.log_test(
-            "租戶1隔離測試",
-            passed,
-            f"期望看到 2 個產品，實際看到 {tenant1_count} 個"
-        )
-        
-        # 測試租戶2只能看到自己的資料
-        self.set_tenant_context(self.tenant2.id)
-        tenant2_count = Product.objects.count()
-        
-        passed = tenant2_count == 1
-        self.log_test(
-            "租戶2隔離測試",
-            passed,
-            f"期望看到 1 個產品，實際看到 {tenant2_count} 個"
-        )
-    
-    def test_cross_tenant_access(self):
-        """測試跨租戶存取防護"""
-        self.stdout.write("\n🔒 測試跨租戶存取防護...")
-        
-        # 在租戶1上下文中查詢租戶2的資料
-        self.set_tenant_context(self.tenant1.id)
-        
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM tenants_product WHERE tenant_id = %s", [self.tenant2.id])
-            count = cursor.fetchone()[0]
-        
-        passed = count == 0
+
+    def setup_test_data(self, branch_ids, sales_count):
+        """建立測試資料 (每間分店在自己的 RLS 上下文中寫入)；回傳各分店的銷售 ID"""
+        self.stdout.write(f"\n🔧 建立 {len(branch_ids)} 間分店 × {sales_count} 筆銷售...")
+        self.cleanup_test_data(branch_ids, quiet=True)
+        today = timezone.localdate()
+        sale_ids = {}
+
+        for i, branch_id in enumerate(branch_ids):
+            with branch_context(branch_id):
+                Branch.objects.create(
+                    id=branch_id,
+                    name=isolation_branch_name(i),
+                    code=f'ISO{i:05d}',
+                    address='隔離測試',
+                    phone='00-0000-0000',
+                )
+                sales = Sales.objects.bulk_create([
+                    Sales(
+                        branch_id=branch_id,
+                        date=today - timedelta(days=n // len(CATEGORIES)),
+                        product_category=CATEGORIES[n % len(CATEGORIES)],
+                        amount=Decimal(100 + n),
+                        transaction_count=1,
+                    )
+                    for n in range(sales_count)
+                ])
+            sale_ids[branch_id] = {str(sale.id) for sale in sales}
+        return sale_ids
+
+    def count_visible(self, branch_id):
+        """(可見分店數, 可見銷售數) in the given branch's context"""
+        with branch_context(branch_id):
+            return Branch.objects.count(), Sales.objects.count()
+
+    def test_basic_isolation(self, branch_ids, sales_count):
+        """測試基本的分店隔離"""
+        self.stdout.write("\n🧪 測試基本分店隔離...")
+
+        for i, branch_id in enumerate(branch_ids[:2]):
+            branches, sales = self.count_visible(branch_id)
+            self.log_test(
+                f"分店{i + 1}隔離測試",
+                branches == 1 and sales == sales_count,
+                f"期望看到 1 間分店、{sales_count} 筆銷售，實際看到 {branches} 間、{sales} 筆"
+            )
+
+    def test_cross_branch_access(self, branch_ids):
+        """測試跨分店存取防護"""
+        self.stdout.write("\n🔒 測試跨分店存取防護...")
+
+        with branch_context(branch_ids[0]):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM tenants_sales WHERE branch_id = %s", [branch_ids[1]])
+                count = cursor.fetchone()[0]
+
         self.log_test(
-            "跨租戶存取防護測試",
-            passed,
-            f"在租戶1上下文中查詢租戶2的產品，結果數量: {count} (應該為0)"
+            "跨分店存取防護測試",
+            count == 0,
+            f"在分店1上下文中查詢分店2的銷售，結果數量: {count} (應該為0)"
         )
-    
-    def test_without_tenant_context(self):
-        """測試沒有租戶上下文的情況"""
-        self.stdout.write("\n🚫 測試沒有租戶上下文的情況...")
-        
-        self.reset_tenant_context()
-        count = Product.objects.count()
-        
-        passed = count == 0
+
+    def test_without_branch_context(self):
+        """測試沒有分店上下文的情況"""
+        self.stdout.write("\n🚫 測試沒有分店上下文的情況...")
+
+        with branch_context(''):
+            branches, sales = Branch.objects.count(), Sales.objects.count()
+
         self.log_test(
-            "無租戶上下文測試",
-            passed,
-            f"沒有租戶上下文時查詢產品，結果數量: {count} (應該為0)"
+            "無分店上下文測試",
+            branches == 0 and sales == 0,
+            f"沒有分店上下文時查詢，分店: {branches}、銷售: {sales} (應該皆為0)"
         )
-    
+
     def test_rls_policies(self):
         """測試 RLS 政策"""
         self.stdout.write("\n📋 測試 RLS 政策...")
-        
+
         with connection.cursor() as cursor:
-            # 檢查 RLS 是否啟用
-            cursor.execute("""
-                SELECT schemaname, tablename, rowsecurity 
-                FROM pg_tables 
-                WHERE tablename = 'tenants_product'
-            """)
-            result = cursor.fetchone()
-            
-            if result:
-                rls_enabled = result[2]
-                self.log_test(
-                    "RLS 啟用狀態",
-                    rls_enabled,
-                    f"RLS 狀態: {'已啟用' if rls_enabled else '未啟用'}"
+            for table in RLS_TABLES:
+                cursor.execute("""
+                    SELECT relrowsecurity, relforcerowsecurity
+                    FROM pg_class
+                    WHERE relname = %s
+                """, [table])
+                result = cursor.fetchone()
+                if result:
+                    self.log_test(
+                        f"{table} RLS 啟用狀態",
+                        result[0] and result[1],
+                        f"ENABLE: {result[0]}, FORCE: {result[1]}"
+                    )
+                else:
+                    self.log_test(f"{table} RLS 啟用狀態", False, f"無法找到 {table} 表")
+
+                cursor.execute("""
+                    SELECT policyname, cmd
+                    FROM pg_policies
+                    WHERE tablename = %s
+                """, [table])
+                policies = cursor.fetchall()
+                self.log_test(f"{table} RLS 政策存在", len(policies) >= 1, f"找到 {len(policies)} 個政策")
+
+                if self.verbose:
+                    for policy in policies:
+                        self.stdout.write(f"   政策: {policy[0]}, 命令: {policy[1]}")
+
+    def test_branch_switching(self, branch_ids):
+        """測試分店切換"""
+        self.stdout.write("\n🔄 測試分店切換...")
+
+        first = self.count_visible(branch_ids[0])
+        second = self.count_visible(branch_ids[1])
+        first_again = self.count_visible(branch_ids[0])
+
+        with branch_context(branch_ids[1]):
+            names = list(Branch.objects.values_list('name', flat=True))
+
+        self.log_test(
+            "分店切換測試",
+            first == first_again and names == [isolation_branch_name(1)],
+            f"分店1: {first}, 分店2: {second} ({names}), 切回分店1: {first_again}"
+        )
+
+    def test_concurrent_isolation(self, branch_ids, sale_ids, options):
+        """多執行緒/多程序交錯請求，檢查每一筆回傳資料都屬於請求的分店"""
+        processes, threads = options['processes'], options['threads']
+        total = processes * threads * options['requests']
+        db = settings.DATABASES['default']
+        self.stdout.write(
+            f"\n⚡ 隔離壓力測試: {processes} 程序 × {threads} 執行緒 × {options['requests']} 請求 "
+            f"(模式: {options['mode']}, 範圍: {getattr(settings, 'BRANCH_CONTEXT_SCOPE', 'session')}, "
+            f"CONN_MAX_AGE: {db.get('CONN_MAX_AGE', 0)}, pool: {bool(db.get('OPTIONS', {}).get('pool'))})"
+        )
+
+        started = time.perf_counter()
+        if processes == 1:
+            stats = stress_process((options, branch_ids, sale_ids, options['seed']))
+        else:
+            # Forked workers must not share the parent's socket
+            connections.close_all()
+            with multiprocessing.Pool(processes=processes) as pool:
+                stats = sum(
+                    pool.map(stress_process, [
+                        (options, branch_ids, sale_ids, options['seed'] + n) for n in range(processes)
+                    ]),
+                    Counter(),
                 )
-            else:
-                self.log_test("RLS 啟用狀態", False, "無法找到 tenants_product 表")
-            
-            # 檢查政策是否存在
-            cursor.execute("""
-                SELECT policyname, cmd, qual 
-                FROM pg_policies 
-                WHERE tablename = 'tenants_product'
-            """)
-            policies = cursor.fetchall()
-            
-            passed = len(policies) >= 2
-            self.log_test(
-                "RLS 政策存在",
-                passed,
-                f"找到 {len(policies)} 個政策"
-            )
-            
-            if self.verbose:
-                for policy in policies:
-                    self.stdout.write(f"   政策: {policy[0]}, 命令: {policy[1]}")
-    
-    def test_tenant_switching(self):
-        """測試租戶切換"""
-        self.stdout.write("\n🔄 測試租戶切換...")
-        
-        # 在租戶1上下文中查詢
-        self.set_tenant_context(self.tenant1.id)
-        count1 = Product.objects.count()
-        
-        # 切換到租戶2
-        self.set_tenant_context(self.tenant2.id)
-        count2 = Product.objects.count()
-        
-        # 再切回租戶1
-        self.set_tenant_context(self.tenant1.id)
-        count1_again = Product.objects.count()
-        
-        passed = count1 == count1_again and count1 != count2
+        elapsed = time.perf_counter() - started
+        self.throughput = stats['requests'] / elapsed if elapsed else 0.0
+
+        for key in COUNTERS:
+            self.stdout.write(f"   {key:<17} {stats[key]}")
+        self.stdout.write(f"   吞吐量: {self.throughput:,.1f} req/s ({stats['requests']} 請求，{elapsed:.2f} 秒)")
+
+        leaks = stats['foreign_rows'] + stats['foreign_branches'] + stats['context_mismatch']
         self.log_test(
-            "租戶切換測試",
-            passed,
-            f"租戶1: {count1} 個產品, 租戶2: {count2} 個產品, 切回租戶1: {count1_again} 個產品"
+            "隔離壓力測試",
+            leaks == 0 and stats['requests'] == total,
+            f"外洩資料列: {stats['foreign_rows']}, 外洩分店: {stats['foreign_branches']}, "
+            f"上下文不符: {stats['context_mismatch']}"
         )
-    
-    def cleanup_test_data(self):
+        if stats['errors'] or stats['short_reads']:
+            self.stdout.write(self.style.WARNING(
+                f"   ⚠️  錯誤: {stats['errors']}, 筆數不足: {stats['short_reads']}"
+            ))
+
+    def cleanup_test_data(self, branch_ids, quiet=False):
         """清理測試資料"""
-        self.stdout.write("🧹 清理測試資料...")
-        
-        deleted_count = Tenant.objects.filter(subdomain__startswith='test').delete()[0]
-        self.stdout.write(self.style.SUCCESS(f"已刪除 {deleted_count} 個測試租戶"))
-    
+        if not quiet:
+            self.stdout.write("\n🧹 清理測試資料...")
+
+        deleted_count = 0
+        for branch_id in branch_ids:
+            with branch_context(branch_id):
+                Sales.objects.all().delete()
+                deleted_count += Branch.objects.filter(id=branch_id).delete()[0]
+
+        if not quiet:
+            self.stdout.write(self.style.SUCCESS(f"已刪除 {deleted_count} 間測試分店"))
+
     def print_summary(self):
         """印出測試摘要"""
         self.stdout.write("\n" + "="*60)
         self.stdout.write("📊 測試結果摘要")
         self.stdout.write("="*60)
-        
+
         passed_count = sum(1 for result in self.test_results if result['passed'])
         total_count = len(self.test_results)
-        
+
         self.stdout.write(f"總測試數: {total_count}")
         self.stdout.write(f"通過測試: {passed_count}")
         self.stdout.write(f"失敗測試: {total_count - passed_count}")
-        self.stdout.write(f"成功率: {passed_count/total_count*100:.1f}%")
-        
+        if total_count:
+            self.stdout.write(f"成功率: {passed_count/total_count*100:.1f}%")
+        if self.throughput is not None:
+            self.stdout.write(f"壓力測試吞吐量: {self.throughput:,.1f} req/s")
+
         if passed_count == total_count:
-            self.stdout.write(self.style.SUCCESS("\n🎉 所有測試都通過！租戶隔離功能正常運作。"))
+            self.stdout.write(self.style.SUCCESS("\n🎉 所有測試都通過！分店隔離功能正常運作。"))
         else:
-            self.stdout.write(self.style.WARNING("\n⚠️  部分測試失敗，請檢查租戶隔離設定。"))
-            
+            self.stdout.write(self.style.WARNING("\n⚠️  部分測試失敗，請檢查分店隔離設定。"))
+
             self.stdout.write("\n失敗的測試:")
             for result in self.test_results:
                 if not result['passed']:
-                    self.stdout.write(self.style.ERROR(f"  - {result['test']}: {result['message']}")) 
\ No newline at end of file
+                    self.stdout.write(self.style.ERROR(f"  - {result['test']}: {result['message']}"))
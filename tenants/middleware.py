@@ -1,35 +1,156 @@
-from django.utils.deprecation import MiddlewareMixin
-from django.db import connection
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
 from django.http import JsonResponse
-from .models import Branch
-import uuid
+from .branch_cache import branch_cache
+from .context import (
+    activate_branch, canonical_branch_id, clear_branch_context, defer_branch_context, is_lazy,
+    is_transaction_scoped, set_branch_context,
+)
+from .budgets import budget_endpoint, resolve_budget
+from .instrumentation import finish_request, start_request
+from .routers import (
+    SAFE_METHODS, choose_read_alias, replica_aliases, reset_read_alias, stick_to_primary, use_read_alias,
+)
+from .throttling import (
+    acquire_slot, branch_limits, release_slot, retry_after, take_token, throttling_enabled,
+)
+from .tokens import BranchTokenError, branch_token_claims, lazy_branch
+import sys
 
-class BranchMiddleware(MiddlewareMixin):
+class BranchMiddleware:
+    """Resolve the request's branch and bind it as the RLS context.
+    
+    Works in both sync (WSGI) and async (ASGI) chains. In async mode the
+    database work runs through sync_to_async(thread_sensitive=True), i.e. on
+    the request's single sync thread -- the same thread, and therefore the
+    same connection, that async ORM calls in the view use.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # A session-level SET survives on a reused connection, so persistent
+        # connections are only safe when the context is transaction-scoped
+        conn_max_age = settings.DATABASES['default'].get('CONN_MAX_AGE', 0)
+        if not is_transaction_scoped() and conn_max_age != 0:
+            raise ImproperlyConfigured(
+                "CONN_MAX_AGE must be 0 unless BRANCH_CONTEXT_SCOPE = 'transaction'"
+            )
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.begin(request)
+        try:
+            if response is None:
+                response = self.get_response(request)
+        except BaseException:
+            self.end_request(request, sys.exc_info())
+            raise
+        return self.finish(request, response)
+    
+    async def __acall__(self, request):
+        response = await sync_to_async(self.begin, thread_sensitive=True)(request)
+        try:
+            if response is None:
+                response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(self.end_request, thread_sensitive=True)(request, sys.exc_info())
+            raise
+        return await sync_to_async(self.finish, thread_sensitive=True)(request, response)
+    
+    def begin(self, request):
+        # Primary or replica: the context must be bound where the reads go
+        branch_id = self._branch_hint(request) if request.method in SAFE_METHODS else None
+        request.db_alias = choose_read_alias(request, branch_id)
+        use_read_alias(request.db_alias)
+        # Measure everything from here on, context statements included
+        start_request(request)
+        if is_transaction_scoped():
+            # The branch context lives and dies with this transaction
+            request._branch_atomic = transaction.atomic(using=request.db_alias)
+            request._branch_atomic.__enter__()
+        try:
+            return self.process_request(request)
+        except BaseException:
+            self.end_request(request, sys.exc_info())
+            raise
+    
+    def finish(self, request, response):
+        try:
+            return self.process_response(request, response)
+        finally:
+            self.end_request(request, sys.exc_info(), response)
+    
+    def end_request(self, request, exc_info, response=None):
+        atomic = getattr(request, '_branch_atomic', None)
+        try:
+            if atomic is not None:
+                del request._branch_atomic
+                atomic.__exit__(*exc_info)
+        finally:
+            try:
+                # execute_wrapper() is a stack: remove the lazy context before the timer
+                lazy = getattr(request, '_lazy_branch_context', None)
+                if lazy is not None:
+                    del request._lazy_branch_context
+                    lazy.__exit__(None, None, None)
+                finish_request(request, response)
+            finally:
+                reset_read_alias()
     
     def process_request(self, request):
-        # Reset branch context
-        with connection.cursor() as cursor:
-            cursor.execute("SET app.current_branch_id = ''")
+        # Reset branch context (skipped if nothing is bound on the connection)
+        using = request.db_alias
+        clear_branch_context(using)
+        
+        # Signed branch token: verified in-process, so only the context SET
+        # is needed and the Branch row is loaded lazily if a view uses it
+        try:
+            claims = branch_token_claims(request)
+        except BranchTokenError as e:
+            return JsonResponse({'error': str(e)}, status=401)
+        if claims:
+            if not claims.active:
+                return JsonResponse({'error': 'Invalid branch'}, status=403)
+            try:
+                self.bind_branch_context(request, claims.branch_id, using)
+            except Exception:
+                clear_branch_context(using)
+                return JsonResponse({'error': 'Branch validation failed'}, status=400)
+            request.branch_id = claims.branch_id
+            request.branch = lazy_branch(claims.branch_id, using)
+            return None
         
         # Get branch ID from request
         branch_id = self._get_branch_id(request)
         
         if branch_id:
             try:
-                # Validate UUID format first
-                uuid.UUID(branch_id)
-                
-                # Set branch context FIRST (before querying)
-                with connection.cursor() as cursor:
-                    cursor.execute("SET app.current_branch_id = %s", [str(branch_id)])
+                # Validate UUID format first; one spelling per branch for
+                # every cache, throttle and sticky key derived from it
+                branch_id = canonical_branch_id(branch_id)
                 
-                # Now validate branch exists (with RLS context applied)
-                branch = Branch.objects.filter(id=branch_id, is_active=True).first()
-                if not branch:
-                    # Reset context if invalid
-                    with connection.cursor() as cursor:
-                        cursor.execute("SET app.current_branch_id = ''")
-                    return JsonResponse({'error': 'Invalid branch'}, status=403)
+                branch = branch_cache.get(branch_id)
+                if branch:
+                    # Known active branch: only the context SET is needed
+                    self.bind_branch_context(request, branch_id, using)
+                else:
+                    # Set branch context and validate the branch in one statement
+                    # (the context is set before the RLS-filtered lookup)
+                    generation = branch_cache.generation()
+                    branch = activate_branch(branch_id, using, self._query_budget(request, branch_id))
+                    if not branch:
+                        # activate_branch_context() already cleared the context
+                        return JsonResponse({'error': 'Invalid branch'}, status=403)
+                    branch_cache.put(branch, generation)
+                    request.query_budget_applied = True
                 
                 # Add to request object
                 request.branch_id = branch_id
@@ -39,8 +160,7 @@ class BranchMiddleware(MiddlewareMixin):
                 return JsonResponse({'error': 'Invalid branch ID format'}, status=400)
             except Exception as e:
                 # Reset context on any error
-                with connection.cursor() as cursor:
-                    cursor.execute("SET app.current_branch_id = ''")
+                clear_branch_context(using)
                 return JsonResponse({'error': 'Branch validation failed'}, status=400)
         else:
             request.branch_id = None
@@ -50,6 +170,34 @@ class BranchMiddleware(MiddlewareMixin):
             if request.path.startswith('/api/') and request.path != '/api/context-status/':
                 return JsonResponse({'error': 'Branch ID required'}, status=400)
     
+    def bind_branch_context(self, request, branch_id, using):
+        # The view's query budget rides along in the same statement
+        budget = self._query_budget(request, branch_id)
+        if is_lazy():
+            # Piggy-back set_config on the first query; none if nothing queries
+            request._lazy_branch_context = defer_branch_context(branch_id, using, budget)
+            request._lazy_branch_context.__enter__()
+        else:
+            set_branch_context(branch_id, using, budget)
+        request.query_budget_applied = True
+    
+    def _query_budget(self, request, branch_id):
+        endpoint = budget_endpoint(request)
+        return resolve_budget(endpoint, branch_id) if endpoint else None
+    
+    def _branch_hint(self, request):
+        # Unvalidated branch for routing decisions (process_request validates)
+        try:
+            claims = branch_token_claims(request)
+        except BranchTokenError:
+            return None
+        if claims:
+            return claims.branch_id
+        try:
+            return canonical_branch_id(self._get_branch_id(request))
+        except (ValueError, TypeError):
+            return None
+    
     def _get_branch_id(self, request):
         # From header (primary method)
         branch_id = request.META.get('HTTP_X_BRANCH_ID')
@@ -73,7 +221,108 @@ class BranchMiddleware(MiddlewareMixin):
         return None
 
     def process_response(self, request, response):
-        # Clean up branch context
-        with connection.cursor() as cursor:
-            cursor.execute("SET app.current_branch_id = ''")
+        # Clean up a session-level branch context; a transaction-scoped one is
+        # discarded at COMMIT, so no reset round trip is needed
+        if not is_transaction_scoped():
+            clear_branch_context(request.db_alias)
+        # Read-your-writes: keep this branch on the primary for a while
+        if (
+            replica_aliases()
+            and request.method not in SAFE_METHODS
+            and getattr(request, 'branch_id', None)
+            and response.status_code < 400
+        ):
+            stick_to_primary(request.branch_id)
+        return response
+
+class BranchThrottleMiddleware:
+    """Per-branch fairness: max in-flight requests and a request-rate bucket.
+    
+    Must come after BranchMiddleware, which resolves request.branch_id.
+    Requests over either limit get 429 with Retry-After, so one heavy branch
+    cannot take every worker and connection from the others. A streaming
+    response keeps its slot until the stream is exhausted.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.admit(request)
+        if response is not None:
+            return response
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.release(request)
+            raise
+        return self.finish(request, response)
+    
+    async def __acall__(self, request):
+        response = await sync_to_async(self.admit)(request)
+        if response is not None:
+            return response
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(self.release)(request)
+            raise
+        return await sync_to_async(self.finish)(request, response)
+    
+    def admit(self, request):
+        branch_id = getattr(request, 'branch_id', None)
+        if not throttling_enabled() or not branch_id:
+            return None
+        max_in_flight, rate, burst = branch_limits(branch_id)
+        
+        wait = take_token(branch_id, rate, burst)
+        if wait:
+            return self.throttled('Branch request rate exceeded', wait)
+        
+        slot = acquire_slot(branch_id, max_in_flight)
+        if slot is False:
+            return self.throttled('Too many concurrent requests for this branch', 1)
+        if slot:
+            request._throttle_slot = slot
+        return None
+    
+    def finish(self, request, response):
+        if getattr(request, '_throttle_slot', None) and response.streaming:
+            if response.is_async:
+                response.streaming_content = self.arelease_after(request, response.streaming_content)
+            else:
+                response.streaming_content = self.release_after(request, response.streaming_content)
+        else:
+            self.release(request)
+        return response
+    
+    def release_after(self, request, content):
+        try:
+            yield from content
+        finally:
+            self.release(request)
+    
+    async def arelease_after(self, request, content):
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            await sync_to_async(self.release)(request)
+    
+    def release(self, request):
+        slot = getattr(request, '_throttle_slot', None)
+        if slot:
+            del request._throttle_slot
+            release_slot(slot)
+    
+    def throttled(self, message, wait):
+        response = JsonResponse({'error': message}, status=429)
+        response['Retry-After'] = retry_after(wait)
         return response
\ No newline at end of file
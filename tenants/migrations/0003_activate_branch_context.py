@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_enable_rls'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            -- Set the branch context and return the branch if it is active,
+            -- in a single statement (one round trip from the middleware).
+            -- The set_config runs before the lookup, so the RLS policy on
+            -- tenants_branch already sees the new context.
+            CREATE OR REPLACE FUNCTION activate_branch_context(p_branch_id UUID, p_is_local BOOLEAN)
+            RETURNS SETOF tenants_branch AS $$
+            BEGIN
+                PERFORM set_config('app.current_branch_id', p_branch_id::text, p_is_local);
+                
+                RETURN QUERY
+                    SELECT * FROM tenants_branch WHERE id = p_branch_id AND is_active;
+                
+                -- Unknown or inactive branch: leave no context behind
+                IF NOT FOUND THEN
+                    PERFORM set_config('app.current_branch_id', '', p_is_local);
+                END IF;
+            END;
+            $$ LANGUAGE plpgsql VOLATILE;
+            
+            GRANT EXECUTE ON FUNCTION activate_branch_context(UUID, BOOLEAN) TO app_role;
+            """,
+            reverse_sql="""
+            DROP FUNCTION IF EXISTS activate_branch_context(UUID, BOOLEAN);
+            """
+        )
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0003_activate_branch_context'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            -- Replace the VOLATILE plpgsql SECURITY DEFINER helper with a STABLE
+            -- SQL function. The planner inlines it into the RLS policies as
+            --   NULLIF(current_setting('app.current_branch_id', true), '')::uuid
+            -- which is evaluated once per scan and can drive an index scan on
+            -- branch_id. An empty context yields NULL (no rows) instead of a
+            -- cast error. The policies reference the function by OID, so they
+            -- pick up the new definition without being recreated.
+            -- LEAKPROOF is not needed: the predicate comes from the policy
+            -- itself and the function takes no row values.
+            CREATE OR REPLACE FUNCTION get_current_branch_id()
+            RETURNS UUID AS $$
+                SELECT NULLIF(current_setting('app.current_branch_id', true), '')::uuid
+            $$ LANGUAGE sql STABLE PARALLEL SAFE;
+            """,
+            reverse_sql="""
+            CREATE OR REPLACE FUNCTION get_current_branch_id() 
+            RETURNS UUID AS $$
+            BEGIN
+                RETURN COALESCE(current_setting('app.current_branch_id', true)::UUID, NULL);
+            END;
+            $$ LANGUAGE plpgsql SECURITY DEFINER;
+            """
+        )
+    ]
@@ -0,0 +1,18 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('tenants', '0004_inline_branch_predicate'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='sales',
+            index=models.Index(fields=['branch', '-date', '-id'], name='sales_branch_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Applies the delta of each INSERT/UPDATE/DELETE statement on tenants_sales
+# to the rollup. Statement-level triggers with transition tables keep bulk
+# writes to one upsert per touched (branch, date, category) key.
+ROLLUP_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION tenants_sales_rollup_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO tenants_salesdailyrollup AS r
+            (branch_id, date, product_category, sales_count, total_amount, transaction_count)
+        SELECT branch_id, date, product_category, -COUNT(*), -SUM(amount), -SUM(transaction_count)
+        FROM old_rows
+        GROUP BY branch_id, date, product_category
+        ON CONFLICT (branch_id, date, product_category) DO UPDATE SET
+            sales_count = r.sales_count + EXCLUDED.sales_count,
+            total_amount = r.total_amount + EXCLUDED.total_amount,
+            transaction_count = r.transaction_count + EXCLUDED.transaction_count;
+    END IF;
+    
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO tenants_salesdailyrollup AS r
+            (branch_id, date, product_category, sales_count, total_amount, transaction_count)
+        SELECT branch_id, date, product_category, COUNT(*), SUM(amount), SUM(transaction_count)
+        FROM new_rows
+        GROUP BY branch_id, date, product_category
+        ON CONFLICT (branch_id, date, product_category) DO UPDATE SET
+            sales_count = r.sales_count + EXCLUDED.sales_count,
+            total_amount = r.total_amount + EXCLUDED.total_amount,
+            transaction_count = r.transaction_count + EXCLUDED.transaction_count;
+    END IF;
+    
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        -- Drop keys that no longer have any sales
+        DELETE FROM tenants_salesdailyrollup r
+        USING (SELECT DISTINCT branch_id, date, product_category FROM old_rows) o
+        WHERE r.branch_id = o.branch_id
+          AND r.date = o.date
+          AND r.product_category = o.product_category
+          AND r.sales_count <= 0;
+    END IF;
+    
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tenants_sales_rollup_insert
+    AFTER INSERT ON tenants_sales
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tenants_sales_rollup_apply();
+
+CREATE TRIGGER tenants_sales_rollup_update
+    AFTER UPDATE ON tenants_sales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tenants_sales_rollup_apply();
+
+CREATE TRIGGER tenants_sales_rollup_delete
+    AFTER DELETE ON tenants_sales
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tenants_sales_rollup_apply();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0005_sales_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('product_category', models.CharField(blank=True, max_length=50)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('transaction_count', models.BigIntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tenants.branch')),
+            ],
+            options={
+                'unique_together': {('branch', 'date', 'product_category')},
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+            -- Same ownership and isolation as tenants_sales (see 0002)
+            ALTER TABLE tenants_salesdailyrollup OWNER TO postgres;
+            
+            ALTER TABLE tenants_salesdailyrollup ENABLE ROW LEVEL SECURITY;
+            ALTER TABLE tenants_salesdailyrollup FORCE ROW LEVEL SECURITY;
+            
+            CREATE POLICY rollup_branch_isolation ON tenants_salesdailyrollup
+                FOR ALL
+                TO app_role
+                USING (branch_id = get_current_branch_id());
+            
+            REVOKE ALL ON tenants_salesdailyrollup FROM PUBLIC;
+            GRANT SELECT, INSERT, UPDATE, DELETE ON tenants_salesdailyrollup TO app_role;
+            GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA public TO app_role;
+            """ + ROLLUP_TRIGGERS_SQL + """
+            -- Backfill from existing sales
+            INSERT INTO tenants_salesdailyrollup
+                (branch_id, date, product_category, sales_count, total_amount, transaction_count)
+            SELECT branch_id, date, product_category, COUNT(*), SUM(amount), SUM(transaction_count)
+            FROM tenants_sales
+            GROUP BY branch_id, date, product_category;
+            """,
+            reverse_sql="""
+            DROP TRIGGER IF EXISTS tenants_sales_rollup_insert ON tenants_sales;
+            DROP TRIGGER IF EXISTS tenants_sales_rollup_update ON tenants_sales;
+            DROP TRIGGER IF EXISTS tenants_sales_rollup_delete ON tenants_sales;
+            DROP FUNCTION IF EXISTS tenants_sales_rollup_apply();
+            DROP POLICY IF EXISTS rollup_branch_isolation ON tenants_salesdailyrollup;
+            """
+        ),
+    ]
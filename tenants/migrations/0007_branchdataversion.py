@@ -0,0 +1,94 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# One upsert per touched branch per statement, so bulk writes bump each
+# branch's version once. The row lock serializes concurrent writers of the
+# same branch only for the rest of their transaction.
+#
+# Deletes only bump existing rows: Branch.delete() removes the version row
+# before the branch's sales, and re-creating it there would violate the FK
+# once the branch itself is gone. Branches with sales always have a row
+# (backfilled below for data loaded before this migration).
+VERSION_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION tenants_sales_bump_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO tenants_branchdataversion AS v (branch_id, version, updated_at)
+        SELECT DISTINCT branch_id, 1, now() FROM new_rows
+        ON CONFLICT (branch_id) DO UPDATE SET version = v.version + 1, updated_at = now();
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE tenants_branchdataversion
+        SET version = version + 1, updated_at = now()
+        WHERE branch_id IN (SELECT branch_id FROM old_rows);
+    ELSE
+        INSERT INTO tenants_branchdataversion AS v (branch_id, version, updated_at)
+        SELECT branch_id, 1, now() FROM (
+            SELECT branch_id FROM old_rows UNION SELECT branch_id FROM new_rows
+        ) changed
+        ON CONFLICT (branch_id) DO UPDATE SET version = v.version + 1, updated_at = now();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tenants_sales_version_insert
+    AFTER INSERT ON tenants_sales
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tenants_sales_bump_version();
+
+CREATE TRIGGER tenants_sales_version_update
+    AFTER UPDATE ON tenants_sales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tenants_sales_bump_version();
+
+CREATE TRIGGER tenants_sales_version_delete
+    AFTER DELETE ON tenants_sales
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tenants_sales_bump_version();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0006_salesdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchDataVersion',
+            fields=[
+                ('branch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='tenants.branch')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(
+            sql="""
+            -- Same ownership and isolation as tenants_sales (see 0002)
+            ALTER TABLE tenants_branchdataversion OWNER TO postgres;
+            
+            ALTER TABLE tenants_branchdataversion ENABLE ROW LEVEL SECURITY;
+            ALTER TABLE tenants_branchdataversion FORCE ROW LEVEL SECURITY;
+            
+            CREATE POLICY version_branch_isolation ON tenants_branchdataversion
+                FOR ALL
+                TO app_role
+                USING (branch_id = get_current_branch_id());
+            
+            REVOKE ALL ON tenants_branchdataversion FROM PUBLIC;
+            GRANT SELECT, INSERT, UPDATE, DELETE ON tenants_branchdataversion TO app_role;
+            
+            INSERT INTO tenants_branchdataversion (branch_id, version, updated_at)
+            SELECT DISTINCT branch_id, 1, now() FROM tenants_sales;
+            """ + VERSION_TRIGGERS_SQL,
+            reverse_sql="""
+            DROP TRIGGER IF EXISTS tenants_sales_version_insert ON tenants_sales;
+            DROP TRIGGER IF EXISTS tenants_sales_version_update ON tenants_sales;
+            DROP TRIGGER IF EXISTS tenants_sales_version_delete ON tenants_sales;
+            DROP FUNCTION IF EXISTS tenants_sales_bump_version();
+            DROP POLICY IF EXISTS version_branch_isolation ON tenants_branchdataversion;
+            """
+        ),
+    ]
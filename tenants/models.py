@@ -29,8 +29,38 @@ class Sales(BranchAwareModel):
     
     class Meta:
         unique_together = ['branch_id', 'date', 'product_category']
+        indexes = [
+            # Keyset pagination: RLS pins branch_id, pages walk (date, id) backwards
+            models.Index(fields=['branch', '-date', '-id'], name='sales_branch_date_id_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if self.branch:
             self.branch_id = self.branch.id
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class SalesDailyRollup(models.Model):
+    """Per-branch, per-day, per-category totals of Sales.
+
+    Maintained incrementally by statement-level triggers on tenants_sales
+    (migration 0006) and covered by the same RLS policy. Rebuild with
+    ``python manage.py rebuild_sales_rollup``.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    date = models.DateField()
+    product_category = models.CharField(max_length=50, blank=True)
+    sales_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    transaction_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['branch', 'date', 'product_category']
+
+class BranchDataVersion(models.Model):
+    """Per-branch counter bumped by a statement-level trigger on every write
+    to tenants_sales (migration 0007). Used to derive ETags for conditional
+    GETs; a branch without a row is at version 0.
+    """
+    branch = models.OneToOneField(Branch, on_delete=models.CASCADE, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
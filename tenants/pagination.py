@@ -0,0 +1,43 @@
+import base64
+import uuid
+from datetime import date
+from django.db.models import Q
+
+
+def encode_keyset(sale_date, sale_id):
+    """Cursor for a (date, id) key, e.g. taken from a values_list row."""
+    raw = f"{sale_date.isoformat()}|{sale_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (date, id) from a cursor token; raises ValueError if malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        cursor_date, cursor_id = raw.split('|')
+        return date.fromisoformat(cursor_date), uuid.UUID(cursor_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def seek(queryset, cursor_date, cursor_id, descending=True):
+    """Rows strictly after (cursor_date, cursor_id) in (date, id) order.
+
+    The ``date <=`` / ``date >=`` bound positions the (branch_id, date, id)
+    index scan directly at the key, so each page costs the same however deep
+    it is; the OR only filters out the rows sharing the key's date.
+    """
+    if descending:
+        return queryset.filter(date__lte=cursor_date).filter(
+            Q(date__lt=cursor_date) | Q(id__lt=cursor_id)
+        )
+    return queryset.filter(date__gte=cursor_date).filter(
+        Q(date__gt=cursor_date) | Q(id__gt=cursor_id)
+    )
+
+
+def after_cursor(queryset, token):
+    """Rows after a cursor token in (-date, -id) order."""
+    cursor_date, cursor_id = decode_cursor(token)
+    return seek(queryset, cursor_date, cursor_id)
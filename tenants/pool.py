@@ -0,0 +1,108 @@
+"""psycopg 3 connection pool integration for the branch context.
+
+The pool (DATABASES['default']['OPTIONS']['pool'], Django >= 5.1) calls
+reset_branch_context() on every connection given back to it. Connections are
+only handed out again after their app.current_branch_id has been cleared; if
+that cannot be verified the callback raises and the pool discards the
+connection. New connections never carry a context, so every checkout starts
+clean.
+
+This module is imported from settings, so it must not import models.
+"""
+import threading
+import time
+from collections import deque
+
+BRANCH_SETTING = 'app.current_branch_id'
+
+
+def reset_branch_context(conn):
+    """psycopg_pool ``reset`` callback (runs on the returned psycopg connection)"""
+    # The pool has already rolled back any open transaction
+    conn.autocommit = True
+    # Query budgets set on the session go back to their defaults as well
+    conn.execute(
+        "SELECT set_config(%s, '', false), "
+        "set_config('statement_timeout', (SELECT reset_val FROM pg_settings WHERE name = 'statement_timeout'), false), "
+        "set_config('lock_timeout', (SELECT reset_val FROM pg_settings WHERE name = 'lock_timeout'), false)",
+        [BRANCH_SETTING]
+    )
+    # Read the setting back as the next checkout would see it
+    value = conn.execute("SELECT current_setting(%s, true)", [BRANCH_SETTING]).fetchone()[0]
+    if value:
+        raise RuntimeError('Branch context could not be cleared; discarding connection')
+
+
+class CheckoutStats:
+    """Latency of getting a connection from the pool, over recent checkouts"""
+
+    def __init__(self, window=1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self._samples.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, longest = self.count, self.total, self.max
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3)
+
+        return {
+            'count': count,
+            'avg_ms': round(total / count * 1000, 3) if count else 0.0,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(longest * 1000, 3),
+        }
+
+
+checkout_stats = CheckoutStats()
+
+
+def ensure_connection_timed(conn):
+    """Open (or check out from the pool) a Django connection, timing the wait"""
+    if conn.connection is not None:
+        return
+    start = time.perf_counter()
+    conn.ensure_connection()
+    checkout_stats.record(time.perf_counter() - start)
+
+
+def pool_stats(conn):
+    """Pool sizing/wait statistics plus checkout latency for a Django connection"""
+    # DatabaseWrapper.pool exists on Django >= 5.1 and is None without OPTIONS['pool']
+    pool = getattr(conn, 'pool', None)
+    stats = {'enabled': pool is not None, 'checkout': checkout_stats.snapshot()}
+    if pool is None:
+        return stats
+
+    raw = pool.get_stats()
+    stats.update({
+        'min_size': raw.get('pool_min'),
+        'max_size': raw.get('pool_max'),
+        'size': raw.get('pool_size'),
+        'available': raw.get('pool_available'),
+        'requests_waiting': raw.get('requests_waiting'),
+        'requests_num': raw.get('requests_num', 0),
+        'requests_queued': raw.get('requests_queued', 0),
+        'requests_wait_ms': raw.get('requests_wait_ms', 0),
+        'requests_errors': raw.get('requests_errors', 0),
+        'returns_bad': raw.get('returns_bad', 0),
+        'connections_num': raw.get('connections_num', 0),
+        'connections_lost': raw.get('connections_lost', 0),
+    })
+    return stats
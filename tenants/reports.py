@@ -0,0 +1,83 @@
+from .routers import read_connection
+
+# date_trunc() units accepted by sales_summary's ?bucket=
+BUCKETS = ('day', 'week', 'month')
+
+# ?group_by= values and the rollup column they map to
+GROUP_BY_COLUMNS = {
+    'category': 'r.product_category',
+}
+
+
+def _filters(branch_id, start, end):
+    # An explicit branch predicate next to RLS: callers running as an owner or
+    # BYPASSRLS role (hq_sales_report) would otherwise read every branch.
+    # Equality on branch_id plus plain ranges on r.date stay sargable on the
+    # (branch_id, date, product_category) unique index
+    conditions, params = ["r.branch_id = %s"], [str(branch_id)]
+    if start:
+        conditions.append("r.date >= %s")
+        params.append(start)
+    if end:
+        conditions.append("r.date <= %s")
+        params.append(end)
+    return f"WHERE {' AND '.join(conditions)}", params
+
+
+def summary_totals(branch_id, start=None, end=None):
+    """Totals for a branch, read from the daily rollup"""
+    where, params = _filters(branch_id, start, end)
+    with read_connection().cursor() as cursor:
+        cursor.execute(f"""
+            SELECT 
+                SUM(r.sales_count) as total_transactions,
+                SUM(r.total_amount) as total_revenue,
+                SUM(r.total_amount) / NULLIF(SUM(r.sales_count), 0) as avg_amount
+            FROM tenants_salesdailyrollup r
+            {where}
+        """, params)
+        stats = cursor.fetchone()
+
+    return {
+        'total_transactions': stats[0] or 0,
+        'total_revenue': str(stats[1]) if stats[1] else '0',
+        'avg_amount': str(stats[2]) if stats[2] else '0'
+    }
+
+
+def sales_series(branch_id, bucket, group_by=None, start=None, end=None):
+    """Totals per time bucket (and optionally per group) in one GROUP BY query"""
+    if bucket not in BUCKETS:
+        raise ValueError(f'Unsupported bucket: {bucket}')
+    group_column = GROUP_BY_COLUMNS[group_by] if group_by else None
+
+    where, params = _filters(branch_id, start, end)
+    group_select = f", {group_column}" if group_column else ''
+    group_key = ', 2' if group_column else ''
+    with read_connection().cursor() as cursor:
+        cursor.execute(f"""
+            SELECT 
+                date_trunc(%s, r.date)::date as bucket{group_select},
+                SUM(r.sales_count) as total_transactions,
+                SUM(r.total_amount) as total_revenue,
+                SUM(r.transaction_count) as transaction_count
+            FROM tenants_salesdailyrollup r
+            {where}
+            GROUP BY 1{group_key}
+            ORDER BY 1{group_key}
+        """, [bucket] + params)
+        rows = cursor.fetchall()
+
+    series = []
+    for row in rows:
+        point = {'bucket': row[0].isoformat()}
+        if group_column:
+            point[group_by] = row[1]
+            row = row[:1] + row[2:]
+        point.update({
+            'total_transactions': row[1],
+            'total_revenue': str(row[2]),
+            'transaction_count': row[3]
+        })
+        series.append(point)
+    return series
@@ -0,0 +1,178 @@
+"""Branch-scoped response cache for read endpoints.
+
+Keys are built from the resolved request.branch_id (in canonical form,
+like the ids writers invalidate with), the branch's cache generation and
+the full request path, so a branch can only ever be served its own
+entries. Writes to a branch's sales replace its generation token
+(signals.py and ingest.upsert_sales), which orphans every cached response
+of that branch at once; orphaned entries simply expire. A random token
+rather than a counter means an evicted generation can never be reused.
+
+The locmem backend is per process: with several workers use a shared
+backend (file, Redis, Memcached) or rely on TIMEOUT to bound staleness.
+"""
+import hashlib
+import threading
+import uuid
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from .context import canonical_branch_id
+
+CACHEABLE_METHODS = ('GET', 'HEAD')
+
+
+def _config():
+    # Read per call so override_settings() can switch the cache off
+    return getattr(settings, 'RESPONSE_CACHE', {})
+
+
+def response_cache():
+    return caches[_config().get('ALIAS', 'default')]
+
+
+def _generation_key(branch_id):
+    # Writers pass a UUID, readers the request's id: one spelling for both
+    return f"branch-response-gen:{canonical_branch_id(branch_id)}"
+
+
+def _generation(cache, branch_id):
+    key = _generation_key(branch_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+async def _ageneration(cache, branch_id):
+    key = _generation_key(branch_id)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, uuid.uuid4().hex, timeout=None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def _response_key(request, generation):
+    path = hashlib.blake2b(request.get_full_path().encode(), digest_size=16).hexdigest()
+    return f"branch-response:{canonical_branch_id(request.branch_id)}:{generation}:{path}"
+
+
+class ResponseCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'timeout': _config().get('TIMEOUT', 30),
+            }
+
+
+response_cache_stats = ResponseCacheStats()
+
+
+def invalidate_branch_responses(branch_id):
+    """Drop all cached responses of a branch once the current transaction commits"""
+    def bump():
+        response_cache().set(_generation_key(branch_id), uuid.uuid4().hex, timeout=None)
+
+    # Bumping before COMMIT would let a concurrent reader re-cache old data
+    transaction.on_commit(bump)
+
+
+def _cacheable(request, cache_if):
+    return (
+        _config().get('ENABLED', True)
+        and request.method in CACHEABLE_METHODS
+        and getattr(request, 'branch_id', None)
+        and (cache_if is None or cache_if(request))
+    )
+
+
+def _storable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def _revalidate(request, response):
+    # A stored ETag is current for as long as the entry's generation is, so
+    # If-None-Match is answered without the version query
+    return get_conditional_response(request, etag=response.get('ETag'), response=response)
+
+
+def cache_branch_response(timeout=None, cache_if=None):
+    """Cache a branch view's successful GET responses.
+
+    ``cache_if(request)`` can restrict caching further (e.g. to the first
+    page). Works on sync and async views. Apply it outside
+    condition_on_branch_version, so a hit needs no database round trip.
+    """
+    def ttl():
+        return _config().get('TIMEOUT', 30) if timeout is None else timeout
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if not _cacheable(request, cache_if):
+                    response_cache_stats.record('bypassed')
+                    return await view(request, *args, **kwargs)
+                cache = response_cache()
+                generation = await _ageneration(cache, request.branch_id)
+                key = _response_key(request, generation)
+                response = await cache.aget(key)
+                if response is not None:
+                    response_cache_stats.record('hits')
+                    response = _revalidate(request, response)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+                response_cache_stats.record('misses')
+                response = await view(request, *args, **kwargs)
+                if _storable(response):
+                    await cache.aset(key, response, ttl())
+                response.headers['X-Cache'] = 'MISS'
+                return response
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if not _cacheable(request, cache_if):
+                    response_cache_stats.record('bypassed')
+                    return view(request, *args, **kwargs)
+                cache = response_cache()
+                generation = _generation(cache, request.branch_id)
+                key = _response_key(request, generation)
+                response = cache.get(key)
+                if response is not None:
+                    response_cache_stats.record('hits')
+                    response = _revalidate(request, response)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+                response_cache_stats.record('misses')
+                response = view(request, *args, **kwargs)
+                if _storable(response):
+                    cache.set(key, response, ttl())
+                response.headers['X-Cache'] = 'MISS'
+                return response
+        return wrapper
+    return decorator
+
+
+def first_page(request):
+    """cache_if for keyset-paginated lists: only the page without a cursor"""
+    return 'cursor' not in request.GET
@@ -0,0 +1,23 @@
+from django.db import connection, transaction
+
+
+def rebuild_rollup():
+    """Recompute tenants_salesdailyrollup from tenants_sales.
+
+    Both statements run under RLS, so inside a branch context only that
+    branch is rebuilt; a role that bypasses RLS rebuilds every branch.
+    Returns the number of rollup rows written.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Block concurrent sales writes so their trigger deltas are not lost
+            cursor.execute("LOCK TABLE tenants_sales IN SHARE MODE")
+            cursor.execute("DELETE FROM tenants_salesdailyrollup")
+            cursor.execute("""
+                INSERT INTO tenants_salesdailyrollup
+                    (branch_id, date, product_category, sales_count, total_amount, transaction_count)
+                SELECT branch_id, date, product_category, COUNT(*), SUM(amount), SUM(transaction_count)
+                FROM tenants_sales
+                GROUP BY branch_id, date, product_category
+            """)
+            return cursor.rowcount
@@ -0,0 +1,84 @@
+"""Read-replica routing for the tenant API.
+
+BranchMiddleware picks the database alias for each request before it binds
+the branch context: safe API requests go to one of REPLICA_DATABASES, and
+everything else (and any branch inside its sticky window) goes to the
+primary. The context is then bound on that alias, and ReplicaRouter sends
+the request's reads there too, so RLS applies on the replica exactly as on
+the primary.
+
+After a successful write, the branch sticks to the primary for
+REPLICA_STICKY_SECONDS so it reads its own writes despite replication lag.
+The marker lives in the cache, so use a shared backend with several workers.
+
+The alias is kept in an asgiref Local, which follows the request into
+sync_to_async threads under ASGI.
+"""
+import random
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+_state = Local()
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def current_read_alias():
+    return getattr(_state, 'alias', None) or DEFAULT_DB_ALIAS
+
+
+def read_connection():
+    """Connection the current request reads from (the primary outside requests)"""
+    return connections[current_read_alias()]
+
+
+def use_read_alias(alias):
+    _state.alias = alias
+
+
+def reset_read_alias():
+    _state.alias = None
+
+
+def _sticky_key(branch_id):
+    return f"branch-primary-sticky:{str(branch_id).lower()}"
+
+
+def stick_to_primary(branch_id):
+    """Route the branch's reads to the primary for the sticky window"""
+    timeout = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+    if replica_aliases() and timeout > 0:
+        caches['default'].set(_sticky_key(branch_id), True, timeout)
+
+
+def choose_read_alias(request, branch_id):
+    """Database alias that serves this request"""
+    replicas = replica_aliases()
+    if not replicas or request.method not in SAFE_METHODS or not request.path.startswith('/api/'):
+        return DEFAULT_DB_ALIAS
+    if branch_id and caches['default'].get(_sticky_key(branch_id)):
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    """Reads follow the alias chosen for the current request; writes go to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db not in replica_aliases()
@@ -0,0 +1,88 @@
+"""Lean serialization for the list endpoints.
+
+Rows are fetched as values_list tuples (no model instances), limited to the
+columns the response needs, and turned into dicts by a precomputed plan.
+Clients can ask for a sparse fieldset with ``?fields=id,amount``. When
+orjson is installed it is used to encode the response.
+"""
+from operator import itemgetter
+from django.http import HttpResponse, JsonResponse
+
+try:
+    import orjson
+except ImportError:
+    # Optional speedup; fall back to the stdlib encoder
+    orjson = None
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+# Response field -> (values_list column or None for a per-request constant, converter)
+BRANCH_FIELDS = {
+    'id': ('id', str),
+    'name': ('name', None),
+    'code': ('code', None),
+    'address': ('address', None),
+    'phone': ('phone', None),
+    'is_active': ('is_active', None),
+}
+
+SALE_FIELDS = {
+    'id': ('id', str),
+    'branch_name': (None, None),  # from request.branch, no join needed
+    'date': ('date', _isoformat),
+    'amount': ('amount', str),
+    'transaction_count': ('transaction_count', None),
+    'product_category': ('product_category', None),
+}
+
+
+def parse_fields(request, spec):
+    """Requested ``fields`` in order, or all of them; raises ValueError on unknown names"""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(spec)
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in spec]
+    if unknown or not fields:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}; available: {", ".join(spec)}')
+    return fields
+
+
+class Projection:
+    """The columns to select for a set of response fields, and how to serialize them.
+
+    ``required`` columns are always selected (e.g. for cursors or totals)
+    even when the client did not ask for them.
+    """
+
+    def __init__(self, spec, fields, required=()):
+        self.spec = spec
+        self.fields = fields
+        columns = [spec[f][0] for f in fields if spec[f][0] is not None]
+        self.columns = list(dict.fromkeys([*columns, *required]))
+
+    def index(self, column):
+        return self.columns.index(column)
+
+    def serialize(self, rows, **constants):
+        getters = []
+        for name in self.fields:
+            column, convert = self.spec[name]
+            if column is None:
+                value = constants[name]
+                getters.append((name, lambda row, value=value: value))
+            elif convert is None:
+                getters.append((name, itemgetter(self.index(column))))
+            else:
+                getters.append((name, lambda row, i=self.index(column), convert=convert: convert(row[i])))
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+def json_response(data, status=200):
+    """JsonResponse, encoded with orjson when it is available"""
+    if orjson is None:
+        return JsonResponse(data, status=status)
+    return HttpResponse(orjson.dumps(data), status=status, content_type='application/json')
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .branch_cache import branch_cache
+from .models import Branch, Sales
+from .response_cache import invalidate_branch_responses
+from .tokens import revoke_branch_tokens
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def invalidate_branch_cache(sender, instance, **kwargs):
+    # Deactivated or deleted branches must stop resolving immediately, and
+    # again at COMMIT: until then a concurrent miss still reads the old row
+    # and would re-cache it for the whole TTL
+    branch_id = instance.id
+    branch_cache.invalidate(branch_id)
+    transaction.on_commit(lambda: branch_cache.invalidate(branch_id), using=kwargs.get('using'))
+    invalidate_branch_responses(instance.id)
+    if kwargs.get('signal') is post_delete or not instance.is_active:
+        # Tokens carry the active flag, so outstanding ones must be refused
+        revoke_branch_tokens(instance.id)
+
+
+@receiver(post_save, sender=Sales)
+@receiver(post_delete, sender=Sales)
+def invalidate_sales_responses(sender, instance, **kwargs):
+    invalidate_branch_responses(instance.branch_id)
@@ -1,3 +1,153 @@
-from django.test import TestCase
+import base64
+import uuid
+from datetime import date
+from unittest import mock
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from . import throttling
+from .models import Branch
+from .pagination import decode_cursor, encode_keyset
+from .tokens import BranchTokenError, issue_branch_token, revoke_branch_tokens, verify_branch_token
 
-# Create your tests here.
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM, BRANCH_TOKEN={'TTL': 60, 'ALLOW_LOCAL_CACHE': True})
+class BranchTokenTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.branch = Branch(id=uuid.uuid4(), is_active=True)
+
+    def issue_at(self, now):
+        with mock.patch('tenants.tokens.time.time', return_value=now):
+            token, _ = issue_branch_token(self.branch)
+        return token
+
+    def verify_at(self, token, now):
+        with mock.patch('tenants.tokens.time.time', return_value=now):
+            return verify_branch_token(token)
+
+    def test_round_trip(self):
+        claims = self.verify_at(self.issue_at(1000), 1030)
+        self.assertEqual(claims.branch_id, str(self.branch.id))
+        self.assertTrue(claims.active)
+        self.assertEqual(claims.expires_at, 1060)
+
+    def test_tampered_token_rejected(self):
+        token = self.issue_at(1000)
+        payload, signature = token.rsplit(':', 1)
+        forged = issue_branch_token(Branch(id=uuid.uuid4(), is_active=True))[0].rsplit(':', 1)[0]
+        for bad in (f'{payload}:{signature[::-1]}', f'{forged}:{signature}', 'garbage', ''):
+            with self.assertRaisesMessage(BranchTokenError, 'Invalid branch token'):
+                self.verify_at(bad, 1030)
+
+    def test_expired_token_rejected(self):
+        token = self.issue_at(1000)
+        self.verify_at(token, 1060)
+        with self.assertRaisesMessage(BranchTokenError, 'Branch token expired'):
+            self.verify_at(token, 1061)
+
+    def test_revoke_branch_tokens_cuts_off_at_revocation_time(self):
+        before = self.issue_at(1000)
+        with mock.patch('tenants.tokens.time.time', return_value=1001):
+            revoke_branch_tokens(self.branch.id)
+        after = self.issue_at(1002)
+
+        with self.assertRaisesMessage(BranchTokenError, 'Branch token revoked'):
+            self.verify_at(before, 1003)
+        self.assertEqual(self.verify_at(after, 1003).branch_id, str(self.branch.id))
+
+    def test_revocation_matches_any_id_spelling(self):
+        token = self.issue_at(1000)
+        with mock.patch('tenants.tokens.time.time', return_value=1001):
+            revoke_branch_tokens(str(self.branch.id).upper())
+        with self.assertRaisesMessage(BranchTokenError, 'Branch token revoked'):
+            self.verify_at(token, 1002)
+
+    @override_settings(BRANCH_TOKEN={'TTL': 60})
+    def test_process_local_cache_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            issue_branch_token(self.branch)
+        with override_settings(BRANCH_TOKEN={'TTL': 60, 'ALLOW_LOCAL_CACHE': True}):
+            token = self.issue_at(1000)
+        with self.assertRaises(ImproperlyConfigured):
+            self.verify_at(token, 1001)
+
+
+class KeysetCursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        sale_id = uuid.uuid4()
+        token = encode_keyset(date(2024, 2, 29), sale_id)
+        self.assertNotIn('=', token)
+        self.assertEqual(decode_cursor(token), (date(2024, 2, 29), sale_id))
+
+    def test_malformed_cursors_rejected(self):
+        def b64(raw):
+            return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+        malformed = [
+            '',
+            '!!!',
+            'not-a-cursor',
+            b64(b'2024-02-29'),
+            b64(f'2024-02-30|{uuid.uuid4()}'.encode()),
+            b64(b'2024-02-29|not-a-uuid'),
+            b64(f'2024-02-29|{uuid.uuid4()}|extra'.encode()),
+            b64(b'\xff\xfe|\x00'),
+        ]
+        for token in malformed:
+            with self.subTest(token=token), self.assertRaisesMessage(ValueError, 'Invalid cursor'):
+                decode_cursor(token)
+
+
+@override_settings(CACHES=LOCMEM)
+class ThrottlingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.branch_id = str(uuid.uuid4())
+
+    def take_at(self, now, rate=10, burst=2):
+        with mock.patch('tenants.throttling.time.time', return_value=now):
+            return throttling.take_token(self.branch_id, rate, burst)
+
+    def test_rate_window_admits_burst_then_waits_for_next_window(self):
+        # rate 10/s, burst 2: windows of 0.2s, so 1000.05 falls in window 5000
+        self.assertEqual(self.take_at(1000.05), 0)
+        self.assertEqual(self.take_at(1000.10), 0)
+        self.assertAlmostEqual(self.take_at(1000.15), 0.05)
+        self.assertAlmostEqual(self.take_at(1000.05), 0.15)
+        self.assertEqual(self.take_at(1000.25), 0)
+
+    def test_rate_windows_are_per_branch(self):
+        self.take_at(1000.05)
+        self.take_at(1000.05)
+        self.assertGreater(self.take_at(1000.05), 0)
+        self.branch_id = str(uuid.uuid4())
+        self.assertEqual(self.take_at(1000.05), 0)
+
+    def test_no_rate_never_throttles(self):
+        for _ in range(5):
+            self.assertEqual(self.take_at(1000.05, rate=0), 0)
+
+    def test_slots_fill_up_and_free_on_release(self):
+        first = throttling.acquire_slot(self.branch_id, 2)
+        second = throttling.acquire_slot(self.branch_id, 2)
+        self.assertTrue(first and second)
+        self.assertNotEqual(first[0], second[0])
+        self.assertIs(throttling.acquire_slot(self.branch_id, 2), False)
+
+        throttling.release_slot(first)
+        third = throttling.acquire_slot(self.branch_id, 2)
+        self.assertEqual(third[0], first[0])
+        self.assertIs(throttling.acquire_slot(self.branch_id, 2), False)
+
+    def test_stale_holder_does_not_release_slot(self):
+        key, holder = throttling.acquire_slot(self.branch_id, 1)
+        throttling.release_slot((key, uuid.uuid4().hex))
+        self.assertIs(throttling.acquire_slot(self.branch_id, 1), False)
+        throttling.release_slot((key, holder))
+        self.assertTrue(throttling.acquire_slot(self.branch_id, 1))
+
+    def test_unlimited_slots(self):
+        self.assertIsNone(throttling.acquire_slot(self.branch_id, 0))
@@ -0,0 +1,97 @@
+"""Per-branch fairness limits used by BranchThrottleMiddleware.
+
+Two limits per branch, both kept in a Django cache so they hold across
+worker processes when the backend is shared (Redis, Memcached; locmem is a
+per-process stand-in for tests). Only atomic cache operations are used, so
+concurrent workers cannot lose each other's updates:
+
+- request rate: a counter per fixed window of BURST / RATE seconds, taken
+  with add() + incr(). A branch gets at most BURST requests per window,
+  i.e. RATE/s on average; across a window boundary it can briefly see up
+  to 2 * BURST.
+- max in-flight requests: MAX_IN_FLIGHT slot keys claimed with add() and
+  deleted on release. A crashed worker's slot expires after IN_FLIGHT_TTL;
+  a slot is only released by the request holding it, so the count can
+  neither go negative nor leak past the TTL.
+
+BRANCH_THROTTLE['OVERRIDES'] raises or lowers the limits of given branches.
+"""
+import math
+import random
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+
+_config = getattr(settings, 'BRANCH_THROTTLE', {})
+
+# Slots expire so a crashed worker cannot pin a branch forever; requests
+# (including streams) running longer than this may be over-admitted
+IN_FLIGHT_TTL = 300
+
+
+def throttling_enabled():
+    return _config.get('ENABLED', False)
+
+
+def _cache():
+    return caches[_config.get('CACHE', 'default')]
+
+
+def branch_limits(branch_id):
+    """(max_in_flight, rate, burst) for a branch; 0 disables a limit"""
+    override = _config.get('OVERRIDES', {}).get(str(branch_id).lower(), {})
+    return (
+        override.get('MAX_IN_FLIGHT', _config.get('MAX_IN_FLIGHT', 0)),
+        override.get('RATE', _config.get('RATE', 0)),
+        override.get('BURST', _config.get('BURST', 0)),
+    )
+
+
+def take_token(branch_id, rate, burst):
+    """Count one request in the branch's current window; returns 0, or seconds until the next window"""
+    if not rate:
+        return 0
+    burst = max(burst, 1)
+    window = burst / rate
+    now = time.time()
+    index = int(now // window)
+    key = f"branch-throttle-rate:{branch_id}:{index}"
+    cache = _cache()
+    cache.add(key, 0, math.ceil(window) + 1)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr(); let this one through
+        return 0
+    if count <= burst:
+        return 0
+    return (index + 1) * window - now
+
+
+def acquire_slot(branch_id, limit):
+    """Claim an in-flight slot; returns its (key, holder), None when unlimited, False when full"""
+    if not limit:
+        return None
+    cache = _cache()
+    holder = uuid.uuid4().hex
+    # Start at a random slot so concurrent requests rarely probe the same keys
+    offset = random.randrange(limit)
+    for i in range(limit):
+        key = f"branch-throttle-slot:{branch_id}:{(offset + i) % limit}"
+        if cache.add(key, holder, IN_FLIGHT_TTL):
+            return key, holder
+    return False
+
+
+def release_slot(slot):
+    key, holder = slot
+    cache = _cache()
+    # Not our slot any more once it expired and another request claimed it
+    if cache.get(key) == holder:
+        cache.delete(key)
+
+
+def retry_after(seconds):
+    """Retry-After header value (whole seconds, at least 1)"""
+    return str(max(1, math.ceil(seconds)))
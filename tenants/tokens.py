@@ -0,0 +1,158 @@
+"""Signed, short-lived branch tokens.
+
+POST /api/branch-token/ (authenticated the usual way, by X-Branch-ID) returns
+a token signed with django.core.signing that carries the branch id, its
+active flag and an expiry. Requests presenting it in X-Branch-Token are
+verified in-process: BranchMiddleware only needs the context SET, and
+request.branch is loaded lazily (from the branch cache when possible) if a
+view actually uses it.
+
+Tokens are only issued to requests authenticated by X-Branch-ID (the full,
+DB-validated path), never to a token holder, so revoking a token or a
+branch cannot be outrun by minting new ones.
+
+Revocation goes through a small deny-list in BRANCH_TOKEN['CACHE']: single
+tokens by their id, and all tokens of a branch issued before it was
+deactivated or deleted (signals.py). Entries only live as long as a token
+can. The cache must be shared by all worker processes; issuing or verifying
+tokens with a process-local backend raises ImproperlyConfigured unless
+BRANCH_TOKEN['ALLOW_LOCAL_CACHE'] is set.
+"""
+import time
+import uuid
+from collections import namedtuple
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import SimpleLazyObject, empty
+from .branch_cache import branch_cache
+from .models import Branch
+
+TOKEN_HEADER = 'HTTP_X_BRANCH_TOKEN'
+SALT = 'tenants.branch-token'
+
+BranchClaims = namedtuple('BranchClaims', ['branch_id', 'active', 'issued_at', 'expires_at', 'token_id'])
+
+
+class BranchTokenError(Exception):
+    pass
+
+
+# Backends whose contents are private to one process
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _config():
+    return getattr(settings, 'BRANCH_TOKEN', {})
+
+
+def token_ttl():
+    return _config().get('TTL', 300)
+
+
+def _cache():
+    return caches[_config().get('CACHE', 'default')]
+
+
+def _shared_cache():
+    """The deny-list cache, refusing one that revocations could not reach"""
+    alias = _config().get('CACHE', 'default')
+    if settings.CACHES[alias]['BACKEND'] in LOCAL_BACKENDS and not _config().get('ALLOW_LOCAL_CACHE', False):
+        raise ImproperlyConfigured(
+            f"Branch tokens need a cache shared by all workers; CACHES['{alias}'] is process-local "
+            "(set BRANCH_TOKEN['CACHE'] or BRANCH_TOKEN['ALLOW_LOCAL_CACHE'])"
+        )
+    return caches[alias]
+
+
+def _denied_key(token_id):
+    return f"branch-token-denied:{token_id}"
+
+
+def _revoked_key(branch_id):
+    return f"branch-token-revoked:{str(branch_id).lower()}"
+
+
+def issue_branch_token(branch):
+    """Token for an active branch; returns (token, expires_at)"""
+    _shared_cache()
+    now = time.time()
+    expires_at = int(now + token_ttl())
+    token = signing.dumps({
+        'b': str(branch.id),
+        'a': branch.is_active,
+        'iat': now,
+        'exp': expires_at,
+        'jti': uuid.uuid4().hex,
+    }, salt=SALT)
+    return token, expires_at
+
+
+def verify_branch_token(token):
+    """Claims of a valid token; raises BranchTokenError otherwise"""
+    try:
+        payload = signing.loads(token, salt=SALT)
+        claims = BranchClaims(
+            str(uuid.UUID(payload['b'])), payload['a'], payload['iat'], payload['exp'], payload['jti']
+        )
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise BranchTokenError('Invalid branch token')
+    if claims.expires_at < time.time():
+        raise BranchTokenError('Branch token expired')
+
+    denied_key, revoked_key = _denied_key(claims.token_id), _revoked_key(claims.branch_id)
+    deny_list = _shared_cache().get_many([denied_key, revoked_key])
+    if denied_key in deny_list or deny_list.get(revoked_key, 0) >= claims.issued_at:
+        raise BranchTokenError('Branch token revoked')
+    return claims
+
+
+def branch_token_claims(request):
+    """Verified claims of the request's X-Branch-Token (None without one).
+
+    The outcome is memoized on the request; raises BranchTokenError.
+    """
+    if not hasattr(request, '_branch_token_claims'):
+        token = request.META.get(TOKEN_HEADER)
+        try:
+            request._branch_token_claims = verify_branch_token(token) if token else None
+        except BranchTokenError as e:
+            request._branch_token_claims = e
+    if isinstance(request._branch_token_claims, BranchTokenError):
+        raise request._branch_token_claims
+    return request._branch_token_claims
+
+
+def revoke_branch_token(claims):
+    _cache().set(_denied_key(claims.token_id), True, max(1, int(claims.expires_at - time.time()) + 1))
+
+
+def revoke_branch_tokens(branch_id):
+    """Reject every token of the branch issued until now"""
+    _cache().set(_revoked_key(branch_id), time.time(), token_ttl() + 1)
+
+
+def lazy_branch(branch_id, using):
+    """request.branch for token requests: no query unless a view uses it"""
+    branch = branch_cache.get(branch_id)
+    if branch is not None:
+        return branch
+
+    def load():
+        generation = branch_cache.generation()
+        branch = Branch.objects.using(using).get(id=branch_id)
+        branch_cache.put(branch, generation)
+        return branch
+
+    return SimpleLazyObject(load)
+
+
+def ensure_branch_loaded(request):
+    """Load a lazy request.branch; async views call this through sync_to_async"""
+    branch = request.branch
+    if isinstance(branch, SimpleLazyObject) and branch._wrapped is empty:
+        branch._setup()
@@ -1,52 +1,69 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.exceptions import ValidationError
-from django.db import connection
+from django.db import connections
 from .models import Branch, Sales
+from .branch_cache import branch_cache
+from .context import same_branch
+from .pool import pool_stats
+from .routers import current_read_alias, read_connection
+from .instrumentation import metrics_access_allowed, metrics_text
+from .budgets import query_budget, timeout_response
+from .conditional import condition_on_branch_version
+from .response_cache import cache_branch_response, first_page, response_cache_stats
+from .tokens import TOKEN_HEADER, branch_token_claims, issue_branch_token, revoke_branch_token
+from .serialization import BRANCH_FIELDS, SALE_FIELDS, Projection, json_response, parse_fields
+from .pagination import after_cursor, encode_keyset
+from .export import CONTENT_TYPES, STREAMERS, export_rows
+from .ingest import build_sale, build_sales, upsert_sales
+from .write_behind import ack_timeout, sales_write_behind, wait_for_commit, write_behind_enabled
+from .reports import BUCKETS, GROUP_BY_COLUMNS, sales_series, summary_totals
 import json
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime, date
 from decimal import Decimal
 
 # Branch related APIs
 
 @csrf_exempt
+@cache_branch_response()
+@query_budget('branch_list')
 def branch_list(request):
     """Branch list API - demonstrates RLS isolation"""
     if not hasattr(request, 'branch_id') or not request.branch_id:
         return JsonResponse({'error': 'Branch context required'}, status=400)
     
     if request.method == 'GET':
+        try:
+            projection = branch_projection(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
         try:
             # RLS ensures each branch only sees its own data
-            branches = Branch.objects.filter(is_active=True)
+            branches = Branch.objects.filter(is_active=True).values_list(*projection.columns)
             
-            data = []
-            for b in branches:
-                branch_data = {
-                    'id': str(b.id),
-                    'name': b.name,
-                    'code': b.code,
-                    'address': b.address,
-                    'phone': b.phone,
-                    'is_active': b.is_active
-                }
-                data.append(branch_data)
+            data = projection.serialize(branches)
             
-            return JsonResponse({
+            return json_response({
                 'branches': data,
                 'count': len(data),
                 'current_branch_id': str(request.branch_id)
             })
             
         except Exception as e:
-            return JsonResponse({'error': f'Query failed: {str(e)}'}, status=500)
+            return timeout_response(e) or JsonResponse({'error': f'Query failed: {str(e)}'}, status=500)
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 # Sales related APIs
 
 @csrf_exempt
+@cache_branch_response(cache_if=first_page)
+@condition_on_branch_version
+@query_budget('sales_list')
 def sales_list(request):
     """Sales records API - RLS automatically filters by branch"""
     if not hasattr(request, 'branch_id') or not request.branch_id:
@@ -54,134 +71,367 @@ def sales_list(request):
     
     if request.method == 'GET':
         try:
-            # Get query parameters
-            limit = int(request.GET.get('limit', 20))
-            
-            # RLS automatically handles permission filtering
-            sales = Sales.objects.select_related('branch').order_by('-date')[:limit]
-            
-            data = []
-            total_amount = Decimal('0')
+            # Get query parameters (page size is capped server-side)
+            try:
+                limit, projection, sales = sales_page_query(request)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
             
-            for s in sales:
-                sale_data = {
-                    'id': str(s.id),
-                    'branch_name': s.branch.name,
-                    'date': s.date.isoformat(),
-                    'amount': str(s.amount),
-                    'transaction_count': s.transaction_count,
-                    'product_category': s.product_category
-                }
-                data.append(sale_data)
-                total_amount += s.amount
+            # Fetch one extra row to know whether another page exists
+            rows = fetch_sales_page(sales, projection, limit)
             
-            return JsonResponse({
-                'sales': data,
-                'count': len(data),
-                'total_amount': str(total_amount),
-                'current_branch_id': str(request.branch_id)
-            })
+            return json_response(sales_page_response(request, rows, projection, limit))
             
         except Exception as e:
-            return JsonResponse({'error': f'Query failed: {str(e)}'}, status=500)
+            return timeout_response(e) or JsonResponse({'error': f'Query failed: {str(e)}'}, status=500)
     
     elif request.method == 'POST':
         try:
             data = json.loads(request.body)
             
-            # Validate branch exists and is accessible
-            try:
-                branch = Branch.objects.get(id=data['branch_id'])
-            except Branch.DoesNotExist:
+            # Validate branch exists and is accessible: BranchMiddleware has
+            # already resolved it, and RLS would hide any other branch anyway
+            if not same_branch(data['branch_id'], request.branch_id):
                 return JsonResponse({'error': 'Branch not found or access denied'}, status=404)
+            branch = request.branch
             
-            sale = Sales.objects.create(
-                branch=branch,
-                date=datetime.strptime(data['date'], '%Y-%m-%d').date(),
-                amount=Decimal(str(data['amount'])),
-                transaction_count=data.get('transaction_count', 1),
-                product_category=data.get('product_category', ''),
-                notes=data.get('notes', '')
-            )
+            future = None
+            if write_behind_enabled():
+                # Nothing validates the row after this, so check it before queueing
+                sale = queued_sale(data, branch)
+                future = sales_write_behind.submit(sale)
+            if future is None:
+                # Synchronous path, also taken when the write-behind queue is full
+                sale = Sales.objects.create(branch=branch, **sale_fields(data))
+                return JsonResponse(sale_created_response(sale), status=201)
             
-            return JsonResponse({
-                'success': True,
-                'sale': {
-                    'id': str(sale.id),
-                    'branch_name': sale.branch.name,
-                    'date': sale.date.isoformat(),
-                    'amount': str(sale.amount)
-                }
-            }, status=201)
+            if wait_for_commit():
+                try:
+                    sale = future.result(timeout=ack_timeout())
+                except FutureTimeout:
+                    pass
+                else:
+                    return JsonResponse(sale_created_response(sale), status=201)
+            return JsonResponse(queued_sale_response(sale), status=202)
             
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON format'}, status=400)
+        except ValidationError as e:
+            return JsonResponse({'error': '; '.join(e.messages)}, status=400)
         except Exception as e:
-            return JsonResponse({'error': f'Create failed: {str(e)}'}, status=500)
+            return timeout_response(e) or JsonResponse({'error': f'Create failed: {str(e)}'}, status=500)
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@csrf_exempt
+@query_budget('sales_bulk')
+def sales_bulk(request):
+    """Bulk sales ingest - idempotent upsert with per-record errors"""
+    if not hasattr(request, 'branch_id') or not request.branch_id:
+        return JsonResponse({'error': 'Branch context required'}, status=400)
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        records = data.get('sales') if isinstance(data, dict) else None
+        if not isinstance(records, list):
+            return JsonResponse({'error': 'sales must be a list'}, status=400)
+        if len(records) > settings.SALES_BULK_MAX_RECORDS:
+            return JsonResponse({
+                'error': f'Too many records (max {settings.SALES_BULK_MAX_RECORDS})'
+            }, status=413)
+        
+        sales, errors = build_sales(records, request.branch_id)
+        upserted = upsert_sales(sales) if sales else 0
+        
+        return JsonResponse({
+            'received': len(records),
+            'upserted': upserted,
+            'failed': len(errors),
+            'errors': errors,
+            'current_branch_id': str(request.branch_id)
+        }, status=200 if upserted or not records else 400)
+        
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON format'}, status=400)
+    except Exception as e:
+        return timeout_response(e) or JsonResponse({'error': f'Bulk ingest failed: {str(e)}'}, status=500)
+
+@csrf_exempt
+def sales_export(request):
+    """Stream all of the branch's sales as NDJSON or CSV (flat worker memory)"""
+    if not hasattr(request, 'branch_id') or not request.branch_id:
+        return JsonResponse({'error': 'Branch context required'}, status=400)
+    
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        export_format, start, end = export_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    rows = export_rows(request.branch_id, start, end)
+    return export_response(request, STREAMERS[export_format](rows), export_format)
+
+# Signed branch tokens
+
+@csrf_exempt
+def branch_token(request):
+    """Issue (POST) or revoke (DELETE) a signed branch token for X-Branch-Token"""
+    if not hasattr(request, 'branch_id') or not request.branch_id:
+        return JsonResponse({'error': 'Branch context required'}, status=400)
+    
+    if request.method == 'POST':
+        if request.META.get(TOKEN_HEADER):
+            # Only the DB-validated X-Branch-ID path may mint tokens
+            return JsonResponse({'error': 'Tokens must be requested with X-Branch-ID'}, status=403)
+        token, expires_at = issue_branch_token(request.branch)
+        return JsonResponse({
+            'token': token,
+            'expires_at': expires_at,
+            'header': 'X-Branch-Token',
+            'current_branch_id': str(request.branch_id)
+        }, status=201)
+    
+    elif request.method == 'DELETE':
+        claims = branch_token_claims(request)
+        if not claims:
+            return JsonResponse({'error': 'X-Branch-Token required'}, status=400)
+        revoke_branch_token(claims)
+        return JsonResponse({'revoked': True})
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 # Simple sales summary for demo
 
 @csrf_exempt
+@cache_branch_response()
+@condition_on_branch_version
+@query_budget('sales_summary')
 def sales_summary(request):
     """Simple sales summary - demonstrates RLS in action"""
     if not hasattr(request, 'branch_id') or not request.branch_id:
         return JsonResponse({'error': 'Branch context required'}, status=400)
     
+    # Optional breakdown: ?bucket=day|week|month&group_by=category&start=&end=
     try:
-        with connection.cursor() as cursor:
-            # Simple statistics (RLS still applies)
-            cursor.execute("""
-                SELECT 
-                    COUNT(s.id) as total_transactions,
-                    SUM(s.amount) as total_revenue,
-                    AVG(s.amount) as avg_amount
-                FROM tenants_sales s
-                JOIN tenants_branch b ON s.branch_id = b.id
-            """)
-            
-            stats = cursor.fetchone()
-            
-            return JsonResponse({
-                'summary': {
-                    'total_transactions': stats[0] or 0,
-                    'total_revenue': str(stats[1]) if stats[1] else '0',
-                    'avg_amount': str(stats[2]) if stats[2] else '0'
-                },
-                'current_branch_id': str(request.branch_id),
-                'note': 'RLS ensures isolation - each branch sees only its own data'
-            })
+        params = summary_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    try:
+        # Statistics come from the daily rollup: O(days), not O(sales)
+        # (RLS still applies)
+        return JsonResponse(summary_response(request, *params))
             
     except Exception as e:
-        return JsonResponse({'error': f'Summary failed: {str(e)}'}, status=500)
+        return timeout_response(e) or JsonResponse({'error': f'Summary failed: {str(e)}'}, status=500)
 
 # Debug endpoint for demo
 
 @csrf_exempt
+@query_budget('context_status')
 def context_status(request):
     """Check current branch context for demo purposes"""
     try:
-        with connection.cursor() as cursor:
-            # Check current context
-            cursor.execute("SELECT * FROM current_branch_context")
-            context_info = cursor.fetchone()
-            
-            visible_branches = Branch.objects.count()
-            visible_sales = Sales.objects.count()
-            
-            return JsonResponse({
-                'context': {
-                    'current_user': context_info[0] if context_info else None,
-                    'current_branch_id': context_info[1] if context_info else None,
-                    'user_type': context_info[3] if context_info else None
-                },
-                'visibility': {
-                    'branches': visible_branches,
-                    'sales': visible_sales
-                },
-                'request_branch_id': str(request.branch_id) if hasattr(request, 'branch_id') and request.branch_id else None
-            })
+        # Check current context
+        context_info = fetch_context_info()
+        
+        visible_branches = Branch.objects.count()
+        visible_sales = Sales.objects.count()
+        
+        return JsonResponse(
+            context_status_response(request, context_info, visible_branches, visible_sales)
+        )
             
     except Exception as e:
-        return JsonResponse({'error': f'Status check failed: {str(e)}'}, status=500)
+        return timeout_response(e) or JsonResponse({'error': f'Status check failed: {str(e)}'}, status=500)
+
+# Prometheus scrape endpoint (outside /api/, so no branch is required; it is
+# guarded by REQUEST_METRICS['TOKEN'] or ['ALLOWED_IPS'] instead)
+
+def metrics(request):
+    """Per-branch, per-endpoint request/DB metrics of this worker process"""
+    if not metrics_access_allowed(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return HttpResponse(metrics_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Request parsing and serialization shared with async_views
+
+def parse_date_param(value):
+    """Parse an optional YYYY-MM-DD query parameter"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def export_params(request):
+    """Return (format, start, end) for sales_export; raises ValueError on bad input"""
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in STREAMERS:
+        raise ValueError('Unsupported format')
+    try:
+        start = parse_date_param(request.GET.get('start'))
+        end = parse_date_param(request.GET.get('end'))
+    except ValueError:
+        raise ValueError('Invalid date format, expected YYYY-MM-DD')
+    return export_format, start, end
+
+def export_response(request, content, export_format):
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[export_format])
+    filename = f"sales-{request.branch.code}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def branch_projection(request):
+    """Branch columns for the requested fieldset; raises ValueError on unknown fields"""
+    return Projection(BRANCH_FIELDS, parse_fields(request, BRANCH_FIELDS))
+
+def sales_page_query(request):
+    """Return (limit, projection, queryset) for a sales page; raises ValueError on bad input"""
+    try:
+        limit = int(request.GET.get('limit', settings.SALES_PAGE_DEFAULT_SIZE))
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('Invalid limit')
+    limit = min(limit, settings.SALES_PAGE_MAX_SIZE)
+    
+    # date/id for the next cursor, amount for the page total
+    projection = Projection(
+        SALE_FIELDS, parse_fields(request, SALE_FIELDS), required=('date', 'id', 'amount')
+    )
+    
+    # RLS automatically handles permission filtering
+    sales = Sales.objects.order_by('-date', '-id')
+    
+    # Keyset pagination on (date, id)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        sales = after_cursor(sales, cursor)
+    return limit, projection, sales
+
+def fetch_sales_page(sales, projection, limit):
+    """Fetch limit + 1 projected rows, each followed by the running amount total.
+    
+    The page query is wrapped in a window SUM, so the page total comes back
+    with the rows instead of being summed in Python.
+    """
+    sql, params = sales.values_list(*projection.columns)[:limit + 1].query.sql_with_params()
+    with connections[sales.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT page.*, SUM(page.amount) OVER ("
+            "ORDER BY page.date DESC, page.id DESC ROWS UNBOUNDED PRECEDING"
+            ") FROM (" + sql + ") page ORDER BY page.date DESC, page.id DESC",
+            params
+        )
+        return cursor.fetchall()
+
+def sales_page_response(request, rows, projection, limit):
+    """Serialize rows from fetch_sales_page()"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    # request.branch may be lazy (token requests): only touch it when needed
+    constants = {'branch_name': request.branch.name} if 'branch_name' in projection.fields else {}
+    data = projection.serialize(rows, **constants)
+    # Running total of the last row on the page
+    total_amount = rows[-1][-1] if rows else Decimal('0')
+    
+    last = rows[-1] if has_more else None
+    return {
+        'sales': data,
+        'count': len(data),
+        'total_amount': str(total_amount),
+        'next': encode_keyset(last[projection.index('date')], last[projection.index('id')]) if last else None,
+        'current_branch_id': str(request.branch_id)
+    }
+
+def sale_fields(data):
+    """Model fields for a single sale from a POST body"""
+    return {
+        'date': datetime.strptime(data['date'], '%Y-%m-%d').date(),
+        'amount': Decimal(str(data['amount'])),
+        'transaction_count': data.get('transaction_count', 1),
+        'product_category': data.get('product_category', ''),
+        'notes': data.get('notes', '')
+    }
+
+def queued_sale(data, branch):
+    """Validated, unsaved sale for the write-behind queue; raises ValidationError"""
+    sale = build_sale(data, branch.id)
+    sale.branch = branch
+    return sale
+
+def sale_created_response(sale):
+    return {
+        'success': True,
+        'sale': {
+            'id': str(sale.id),
+            'branch_name': sale.branch.name,
+            'date': sale.date.isoformat(),
+            'amount': str(sale.amount)
+        }
+    }
+
+def queued_sale_response(sale):
+    """Body of a 202: the sale is queued, its batch not committed yet"""
+    body = sale_created_response(sale)
+    body['queued'] = True
+    return body
+
+def summary_params(request):
+    """Return (bucket, group_by, start, end); raises ValueError on bad input"""
+    bucket = request.GET.get('bucket')
+    group_by = request.GET.get('group_by')
+    if bucket and bucket not in BUCKETS:
+        raise ValueError(f'bucket must be one of {", ".join(BUCKETS)}')
+    if group_by and group_by not in GROUP_BY_COLUMNS:
+        raise ValueError(f'group_by must be one of {", ".join(GROUP_BY_COLUMNS)}')
+    if group_by and not bucket:
+        raise ValueError('group_by requires bucket')
+    try:
+        start = parse_date_param(request.GET.get('start'))
+        end = parse_date_param(request.GET.get('end'))
+    except ValueError:
+        raise ValueError('Invalid date format, expected YYYY-MM-DD')
+    return bucket, group_by, start, end
+
+def summary_response(request, bucket, group_by, start, end):
+    response = {
+        'summary': summary_totals(request.branch_id, start, end),
+        'current_branch_id': str(request.branch_id),
+        'note': 'RLS ensures isolation - each branch sees only its own data'
+    }
+    if bucket:
+        response['bucket'] = bucket
+        response['group_by'] = group_by
+        response['series'] = sales_series(request.branch_id, bucket, group_by, start, end)
+    return response
+
+def fetch_context_info():
+    """Current RLS context as seen by the database the request reads from"""
+    with read_connection().cursor() as cursor:
+        cursor.execute("SELECT * FROM current_branch_context")
+        return cursor.fetchone()
+
+def context_status_response(request, context_info, visible_branches, visible_sales):
+    return {
+        'context': {
+            'current_user': context_info[0] if context_info else None,
+            'current_branch_id': context_info[1] if context_info else None,
+            'user_type': context_info[3] if context_info else None
+        },
+        'visibility': {
+            'branches': visible_branches,
+            'sales': visible_sales
+        },
+        'request_branch_id': str(request.branch_id) if getattr(request, 'branch_id', None) else None,
+        'branch_cache': branch_cache.stats(),
+        'response_cache': response_cache_stats.snapshot(),
+        'database': current_read_alias(),
+        'pool': pool_stats(read_connection()),
+        'write_behind': sales_write_behind.stats()
+    }
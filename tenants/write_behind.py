@@ -0,0 +1,205 @@
+"""Write-behind group commit for single sale submissions.
+
+With SALES_WRITE_BEHIND['ENABLED'], sales_list POST hands the validated,
+unsaved Sales row to an in-process queue instead of committing it itself.
+A daemon thread drains the queue every FLUSH_INTERVAL seconds (or as soon
+as FLUSH_SIZE rows are waiting), groups the rows per branch and writes
+each group with ingest.insert_sales() inside branch_context(), i.e. one
+transaction under that branch's RLS context per branch and flush.
+
+WAIT_FOR_COMMIT makes the view wait (at most ACK_TIMEOUT seconds) for its
+batch to commit and answer 201 as before, so an acknowledged sale is
+durable and the acknowledgement delay is bounded by the flush interval.
+Without it, or when the wait times out, the view answers 202 as soon as
+the row is queued; such rows are lost if the process dies before the next
+flush. A full queue (MAX_QUEUE) falls back to the synchronous insert.
+
+Writes are insert-only, like the synchronous Sales.objects.create(): a
+sale whose (branch_id, date, product_category) key already exists, or was
+queued earlier in the same batch, fails with IntegrityError instead of
+overwriting it; the waiting view reports it as the synchronous path does
+(a 202 caller only finds out by reading the sale back). The queue is per
+worker process; the thread starts on first use, after any fork.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from .context import branch_context
+from .ingest import insert_sales
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'SALES_WRITE_BEHIND', {})
+
+
+def write_behind_enabled():
+    return _config.get('ENABLED', False)
+
+
+def wait_for_commit():
+    return _config.get('WAIT_FOR_COMMIT', True)
+
+
+def ack_timeout():
+    return _config.get('ACK_TIMEOUT', 5)
+
+
+def duplicate_sale_error(branch_id):
+    return IntegrityError(
+        f'duplicate key value violates unique constraint: branch {branch_id} '
+        f'already has a sale for this date and product_category'
+    )
+
+
+class SalesWriteBehind:
+    """Queue of (sale, future) pairs flushed by one background thread"""
+
+    def __init__(self, flush_size=500, flush_interval=0.05, max_queue=10000):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'rejected': 0, 'flushes': 0, 'written': 0, 'failed': 0}
+
+    def submit(self, sale):
+        """Queue an unsaved sale; returns a Future of the saved row, or None when full"""
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((sale, future))
+        except queue.Full:
+            self._count('rejected')
+            return None
+        self._count('queued')
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sales-write-behind', daemon=True)
+                self._thread.start()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _take_batch(self):
+        """Block for the first row, then gather more until the batch is full or the interval ends"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self.flush(batch)
+            except Exception:
+                logger.exception('Write-behind flush failed')
+            finally:
+                # Give the connection back (or drop it) between flushes
+                close_old_connections()
+
+    def drain(self):
+        """Flush whatever is queued now, in the calling thread"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.flush(batch)
+
+    def flush(self, batch):
+        by_branch = {}
+        for sale, future in batch:
+            by_branch.setdefault(sale.branch_id, []).append((sale, future))
+        self._count('flushes')
+        for branch_id, items in by_branch.items():
+            self._flush_branch(branch_id, items)
+
+    def _flush_branch(self, branch_id, items):
+        # The first submission of a key is inserted; later ones in the batch
+        # fail as they would have against the committed row
+        first = {}
+        for sale, future in items:
+            key = (sale.date, sale.product_category)
+            if key in first:
+                self._fail(future, duplicate_sale_error(branch_id))
+            else:
+                first[key] = (sale, future)
+
+        try:
+            with branch_context(branch_id):
+                inserted = insert_sales([sale for sale, _ in first.values()])
+        except Exception:
+            # Retry row by row so one bad sale does not fail its whole batch
+            for sale, future in first.values():
+                self._flush_one(branch_id, sale, future)
+            return
+
+        for sale, future in first.values():
+            self._resolve(branch_id, sale, future, inserted)
+
+    def _flush_one(self, branch_id, sale, future):
+        try:
+            with branch_context(branch_id):
+                inserted = insert_sales([sale])
+        except Exception as e:
+            logger.warning('Write-behind sale for branch %s failed: %s', branch_id, e)
+            self._fail(future, e)
+            return
+        self._resolve(branch_id, sale, future, inserted)
+
+    def _resolve(self, branch_id, sale, future, inserted):
+        if sale.id in inserted:
+            self._count('written')
+            future.set_result(sale)
+        else:
+            self._fail(future, duplicate_sale_error(branch_id))
+
+    def _fail(self, future, exc):
+        self._count('failed')
+        future.set_exception(exc)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        stats['enabled'] = write_behind_enabled()
+        return stats
+
+
+sales_write_behind = SalesWriteBehind(
+    flush_size=_config.get('FLUSH_SIZE', 500),
+    flush_interval=_config.get('FLUSH_INTERVAL', 0.05),
+    max_queue=_config.get('MAX_QUEUE', 10000),
+)
+
+
+@atexit.register
+def _drain_on_exit():
+    # Best effort on a clean shutdown; a crash still loses the queue
+    if write_behind_enabled():
+        try:
+            sales_write_behind.drain()
+        except Exception:
+            logger.exception('Write-behind drain on exit failed')